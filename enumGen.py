@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
-from enumGen import main
 import sys
 
 if __name__ == '__main__':
-  gen = main.EnumGenerator()
-  sys.exit(gen.run())
+  # forwards the command to a running server (enumGen.py serve) or runs it here
+  from enumGen import client
+  sys.exit(client.run(sys.argv[1:]))
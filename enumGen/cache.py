@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import functools
+from pathlib import Path
+import typing as T
+from .enums import EnumInfo
+
+# A hash of the sources of enumGen. It is part of every cache key, so entries
+# written by other code (e.g. before an update of the parser) are never used
+@functools.lru_cache(maxsize=None)
+def sourceStamp() -> str:
+  h = hashlib.sha256()
+  for i in sorted(Path(__file__).parent.glob('*.py')):
+    h.update(i.name.encode() + b'\0' + i.read_bytes() + b'\0')
+  return h.hexdigest()
+
+# Base of the on disk caches
+#
+# Entries are keyed by a hash of their inputs, the tool version and the
+# sources (see sourceStamp), so a hit is valid as long as the key covers
+# every input. Every entry is one JSON file named after its key. Entries are written to a temporary file and
+# renamed into place, so parallel build jobs only ever see complete entries. The
+# mtime of an entry is its last access time, which is used for LRU eviction.
+class DiskCache:
+  label = 'Cache'
+
+  def __init__(self, directory: Path, maxSize: int, version: str) -> None:
+    self.dir     = directory
+    self.maxSize = maxSize
+    self.version = version
+    self.hits    = 0
+    self.misses  = 0
+    self.evicted = 0
+    self.dir.mkdir(parents=True, exist_ok=True)
+
+  def entry(self, key: str) -> Path:
+    return self.dir / f'{key}.json'
+
+  # Reads an entry and marks it as recently used. Returns None if key is not
+  # in the cache or the entry is not valid JSON
+  def read(self, key: str) -> T.Any:
+    path = self.entry(key)
+    try:
+      data = json.loads(path.read_text())
+      os.utime(path)
+    except (OSError, ValueError):
+      # Not cached, evicted by a parallel job or corrupt
+      return None
+    return data
+
+  def write(self, key: str, text: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=self.dir, prefix=f'{key}.', suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'w') as fp:
+        fp.write(text)
+      os.chmod(tmp, 0o644)
+      os.replace(tmp, self.entry(key))
+    except BaseException:
+      Path(tmp).unlink(missing_ok=True)
+      raise
+
+  # Removes the least recently used entries until the cache fits into maxSize.
+  # This reads the whole directory, so it is only called once per run
+  def evict(self) -> None:
+    entries: T.List[T.Tuple[float, int, Path]] = []
+    now = time.time()
+    for i in self.dir.iterdir():
+      try:
+        st = i.stat()
+        # leftovers from killed jobs
+        if i.suffix == '.tmp' and now - st.st_mtime > 3600:
+          i.unlink()
+        elif i.suffix == '.json':
+          entries += [(st.st_mtime, st.st_size, i)]
+      except OSError:
+        continue
+
+    size = sum(x[1] for x in entries)
+    for _, entrySize, path in sorted(entries):
+      if size <= self.maxSize:
+        break
+      try:
+        path.unlink()
+        self.evicted += 1
+      except OSError:
+        pass  # already removed by a parallel job
+      size -= entrySize
+
+  def stats(self) -> str:
+    return f'{self.hits} hits, {self.misses} misses, {self.evicted} evicted'
+
+  def logStats(self) -> None:
+    logging.info(f'{self.label} {self.dir}: {self.stats()}')
+
+# On disk cache for the enum lists of parsed headers, keyed by the header content
+class ParseCache(DiskCache):
+  label = 'Parse cache'
+
+  def key(self, fp: Path) -> str:
+    h = hashlib.sha256()
+    h.update(self.version.encode() + b'\0' + sourceStamp().encode() + b'\0')
+    with fp.open('rb') as f:
+      for chunk in iter(lambda: f.read(1 << 20), b''):
+        h.update(chunk)
+    return h.hexdigest()
+
+  # Returns the cached enum list and raw includes or None if key is not in the cache
+  def load(self, key: str) -> T.Optional[T.Tuple[T.List[EnumInfo], T.List[str]]]:
+    data = self.read(key)
+    try:
+      if not isinstance(data, dict) or not isinstance(data.get('includes'), list):
+        raise TypeError('not a cache entry')
+      enums = [EnumInfo.fromJSON(x) for x in data['enums']]
+    except (KeyError, TypeError, ValueError):
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    return enums, data['includes']
+
+  # Passes the enums through and stores them in the cache once all were
+  # generated. includes must be complete at this point. A parse that ended
+  # with open scopes is not stored, so the warning about it is not hidden
+  def record(self, key: str, enums: T.Iterable[EnumInfo], includes: T.List[str], openScopes: T.List[str]) -> T.Iterator[EnumInfo]:
+    fd, tmp = tempfile.mkstemp(dir=self.dir, prefix=f'{key}.', suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'w') as fp:
+        fp.write('{"enums": [')
+        sep = ''
+        for i in enums:
+          fp.write(sep + json.dumps(i.toJSON()))
+          sep = ','
+          yield i
+        fp.write(f'], "includes": {json.dumps(includes)}}}')
+
+      if openScopes:
+        Path(tmp).unlink()
+        return
+      os.chmod(tmp, 0o644)
+      os.replace(tmp, self.entry(key))
+    except BaseException:
+      Path(tmp).unlink(missing_ok=True)
+      raise
+
+# On disk cache for the generated code of enums (see Generator.render). The
+# key is built from everything the code of an enum depends on, including the
+# generator itself (see sourceStamp)
+class FragmentCache(DiskCache):
+  label = 'Fragment cache'
+
+  def key(self, *parts: str) -> str:
+    h = hashlib.sha256()
+    h.update(self.version.encode() + b'\0' + sourceStamp().encode() + b'\0')
+    for i in parts:
+      h.update(i.encode() + b'\0')
+    return h.hexdigest()
+
+  # Returns the cached sections or None if key is not in the cache
+  def load(self, key: str) -> T.Optional[T.List[str]]:
+    data = self.read(key)
+    if not isinstance(data, list) or not all(isinstance(x, str) for x in data):
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    return data
+
+  def store(self, key: str, sections: T.List[str]) -> None:
+    self.write(key, json.dumps(sections))
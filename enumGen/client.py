@@ -0,0 +1,140 @@
+import os
+import sys
+import stat
+import zlib
+import socket
+import struct
+import marshal
+import typing as T
+
+# The client of enumGen.py serve (see server.py). It only imports a few
+# modules of the standard library (no json), so forwarding a command is much
+# cheaper than importing the generator.
+#
+# The client connects to the socket, passes its stdin, stdout and stderr and
+# sends a message with the command line, the working directory, the
+# environment, the umask and the stamp of the package. The server runs the
+# command with them and replies with {'exit': code} or {'stale': True} if it
+# runs other code than the client. Both sides check that the other one is the
+# same user (see peerUid) and the same Python (see packageStamp), so the
+# messages are marshalled dicts, each with the size as a prefix.
+
+packageDir = os.path.dirname(os.path.abspath(__file__))
+
+# The Python version, the package directory and the latest mtime of its modules
+def packageStamp() -> str:
+  latest = max(x.stat().st_mtime_ns for x in os.scandir(packageDir) if x.name.endswith('.py'))
+  return f'{sys.version}:{packageDir}:{latest}'
+
+def sendMessage(sock: socket.socket, data: T.Dict[str, T.Any]) -> None:
+  raw = marshal.dumps(data)
+  sock.sendall(len(raw).to_bytes(4, 'little') + raw)
+
+# Raises EOFError if the connection was closed before the message was complete
+def recvMessage(sock: socket.socket) -> T.Dict[str, T.Any]:
+  def recvExactly(size: int) -> bytes:
+    res = b''
+    while len(res) < size:
+      chunk = sock.recv(size - len(res))
+      if not chunk:
+        raise EOFError('connection closed')
+      res += chunk
+    return res
+
+  res = marshal.loads(recvExactly(int.from_bytes(recvExactly(4), 'little')))
+  if not isinstance(res, dict):
+    raise ValueError('invalid message')
+  return res
+
+# The uid of the process on the other end of sock or None if it is not known
+def peerUid(sock: socket.socket) -> T.Optional[int]:
+  if not hasattr(socket, 'SO_PEERCRED'):
+    return None
+  _, uid, _ = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+  return int(uid)
+
+# $ENUMGEN_SOCKET (disabled if empty) or a socket per package in a directory
+# that only the user can access: $XDG_RUNTIME_DIR or enumGen-<uid> in the
+# temporary directory (created with create). None without Unix sockets or if
+# the directory is missing or can be accessed by others
+def socketPath(create: bool = False) -> T.Optional[str]:
+  if not hasattr(socket, 'AF_UNIX') or not hasattr(socket, 'send_fds'):
+    return None
+
+  path = os.environ.get('ENUMGEN_SOCKET')
+  if path is not None:
+    return path or None
+
+  base = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(os.environ.get('TMPDIR') or '/tmp', f'enumGen-{os.getuid()}')
+  try:
+    if create and not os.path.lexists(base):
+      os.mkdir(base, 0o700)
+    st = os.lstat(base)
+  except OSError:
+    return None
+
+  if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+    return None
+  return os.path.join(base, f'enumGen-{zlib.crc32(packageDir.encode()):08x}.sock')
+
+# Runs argv on the server. Returns its exit code or None if no (current)
+# server of the user is running. Once the request was sent, the command may
+# already have run (partly), so it is never run again: a server that fails
+# to reply is an error
+def forward(argv: T.List[str], path: str) -> T.Optional[int]:
+  mask = os.umask(0)
+  os.umask(mask)
+  request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ), 'umask': mask, 'stamp': packageStamp()}
+
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    try:
+      sock.connect(path)
+      if peerUid(sock) != os.getuid():
+        return None
+      sys.stdout.flush()
+      sys.stderr.flush()
+      socket.send_fds(sock, [b'\0'], [0, 1, 2])
+      sendMessage(sock, request)
+    except OSError:
+      return None
+
+    try:
+      reply = recvMessage(sock)
+    except (OSError, ValueError, EOFError) as err:
+      reply = {'error': str(err) or type(err).__name__}
+
+  if reply.get('stale'):
+    return None
+  if 'exit' not in reply:
+    sys.stderr.write(f'ERROR: The server on {path} failed: {reply.get("error", "invalid reply")}\n')
+    return 1
+  return int(reply['exit'])
+
+# The command of argv (the first argument that is not a global option of
+# main.EnumGenerator or its value) or None
+def command(argv: T.List[str]) -> T.Optional[str]:
+  args = iter(argv)
+  for i in args:
+    if i == '--config':
+      next(args, None)
+    elif i.startswith('-') and not i.startswith('--'):
+      # -c CFG and -W OUT, also as -cCFG or in -VC -Vc CFG
+      flags = i[1:]
+      for k, c in enumerate(flags):
+        if c in 'cW':
+          if k == len(flags) - 1:
+            next(args, None)
+          break
+    elif not i.startswith('-'):
+      return i
+  return None
+
+def run(argv: T.List[str]) -> int:
+  path = socketPath()
+  if path is not None and command(argv) != 'serve' and os.path.exists(path):
+    res = forward(argv, path)
+    if res is not None:
+      return res
+
+  from .main import EnumGenerator
+  return EnumGenerator(argv).run()
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import textwrap
+import concurrent.futures
+from pathlib import Path
+import typing as T
+from . import parser, enums, regions, intermediate
+from .cache import ParseCache
+from .output import updateFile, updateBinaryFile
+
+if T.TYPE_CHECKING:
+  from .enums import EnumInfo
+
+class CompileOptions(T.NamedTuple):
+  chunkSize:      int                     # > 0 enables the streaming mode
+  cacheDir:       T.Optional[Path]        # None disables the parse cache
+  cacheSize:      int
+  version:        str
+  followIncludes: bool = False
+  includeDirs:    T.Tuple[Path, ...] = ()
+  sharedDir:      T.Optional[Path] = None  # output directory of included headers
+  outputs:        T.Dict[Path, Path] = {}  # the output files of the requested headers
+  incremental:    bool = False             # only parse the regions that changed since the last output
+  compact:        bool = False             # write the compact intermediate format instead of JSON
+
+class CompileResult(T.NamedTuple):
+  input:    Path
+  output:   Path
+  seconds:  float
+  error:    str   # empty on success
+  hits:     int   # parse cache statistics
+  misses:   int
+  includes: T.List[Path] = []  # resolved includes (only when following includes)
+
+# Writes the same JSON as json.dumps(out, indent=2) but one enum at a time.
+# includes is called after all enums were written. Regions are written one per line
+def writeEnumsJSON(fp: T.TextIO, file: str, enumIter: T.Iterable['EnumInfo'], includes: T.Optional[T.Callable[[], T.List[str]]] = None,
+                   regionList: T.Optional[T.List[regions.Region]] = None) -> None:
+  fp.write(f'{{\n  "file": {json.dumps(file)},\n  "enums": [')
+  sep = '\n'
+  for i in enumIter:
+    fp.write(sep + textwrap.indent(json.dumps(i.toJSON(), indent=2), '    '))
+    sep = ',\n'
+
+  fp.write(']' if sep == '\n' else '\n  ]')
+  if regionList is not None:
+    fp.write(',\n  "regions": [\n    ' + ',\n    '.join(json.dumps(x.toJSON()) for x in regionList) + '\n  ]')
+  if includes is not None:
+    fp.write(',\n  "includes": ' + textwrap.indent(json.dumps(includes(), indent=2), '  ')[2:])
+  fp.write('\n}')
+
+# Finds the header of a raw '"file.h"' or '<file.h>' include
+def resolveInclude(raw: str, fromFile: Path, includeDirs: T.Sequence[Path]) -> T.Optional[Path]:
+  dirs = list(includeDirs)
+  if raw.startswith('"'):
+    dirs = [fromFile.parent] + dirs
+
+  for i in dirs:
+    candidate = i / raw[1:-1]
+    if candidate.is_file():
+      return candidate.resolve()
+
+  return None
+
+# The JSON file of a header: either requested explicitly or an included header in sharedDir
+def outputFor(header: Path, opts: CompileOptions) -> Path:
+  if header in opts.outputs:
+    return opts.outputs[header]
+
+  assert opts.sharedDir is not None
+  digest = hashlib.sha1(header.as_posix().encode()).hexdigest()[:8]
+  return opts.sharedDir / f'{header.stem}-{digest}{".enums" if opts.compact else ".json"}'
+
+# The last output of a header if it can be used for an incremental parse
+def previousResult(out_file: Path) -> T.Optional[T.Dict[str, T.Any]]:
+  try:
+    data = intermediate.loadJSON(out_file)
+  except (OSError, ValueError, KeyError, TypeError):
+    return None
+
+  return data if isinstance(data, dict) and 'regions' in data else None
+
+# Parses in_file and writes the enum list to out_file. Returns the resolved
+# includes if opts.followIncludes is set
+def compileHeader(in_file: Path, out_file: Path, opts: CompileOptions, cache: T.Optional[ParseCache]) -> T.List[Path]:
+  e = enums.Enums()
+  scopeStack: T.List[str] = []
+  enumIter: T.Iterable['EnumInfo']
+  includes: T.List[str] = []  # only complete after enumIter was consumed
+  regionList = None
+  cached = None
+
+  if cache and not opts.incremental:
+    key = cache.key(in_file)
+    cached = cache.load(key)
+
+  if opts.incremental:
+    regionList = regions.parse(in_file, previousResult(out_file), opts.version)
+    enumIter = [x for r in regionList for x in r.enums]
+    includes = [x for r in regionList for x in r.includes]
+  elif cached is not None:
+    logging.info(f'Using the cached enums of {in_file.name}')
+    enumIter, includes = cached
+  elif opts.chunkSize > 0:
+    p = parser.Parser(in_file, opts.chunkSize)
+    enumIter = e.iterScope(p.stream(), scopeStack)
+    includes = p.includes
+  else:
+    p = parser.Parser(in_file)
+    p.parse()
+    enumIter = e.iterScope(p.getResult(), scopeStack)
+    includes = p.includes
+
+  if cache and cached is None and regionList is None:
+    enumIter = cache.record(key, enumIter, includes, scopeStack)
+
+  resolved: T.List[Path] = []
+
+  def references() -> T.List[str]:
+    for i in includes:
+      header = resolveInclude(i, in_file, opts.includeDirs)
+      if header is not None and header not in resolved:
+        resolved.append(header)
+    return [outputFor(x, opts).as_posix() for x in resolved]
+
+  if opts.compact:
+    with updateBinaryFile(out_file) as binFp:
+      intermediate.writeCompact(binFp, in_file.as_posix(), enumIter, references if opts.followIncludes else None, regionList)
+  else:
+    with updateFile(out_file) as fp:
+      writeEnumsJSON(fp, in_file.as_posix(), enumIter, references if opts.followIncludes else None, regionList)
+
+  if scopeStack:
+    logging.warning(f'Parsing error in {in_file.name}: scope stack not empty')
+
+  return resolved
+
+# Compiles one header of a batch. Errors are returned instead of raised, so
+# that a broken header only fails itself
+def compileJob(in_file: Path, out_file: Path, opts: CompileOptions) -> CompileResult:
+  start = time.perf_counter()
+  cache = ParseCache(opts.cacheDir, opts.cacheSize, opts.version) if opts.cacheDir else None
+  error = ''
+  includes: T.List[Path] = []
+
+  try:
+    includes = compileHeader(in_file, out_file, opts, cache)
+  except Exception as ex:
+    error = f'{type(ex).__name__}: {ex}'
+    out_file.unlink(missing_ok=True)
+
+  hits   = cache.hits   if cache else 0
+  misses = cache.misses if cache else 0
+  return CompileResult(in_file, out_file, time.perf_counter() - start, error, hits, misses, includes)
+
+def initWorker(level: int) -> None:
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=level)
+
+def availableCores() -> int:
+  try:
+    return len(os.sched_getaffinity(0))
+  except AttributeError:
+    return os.cpu_count() or 1
+
+# Compiles all (input, output) pairs in jobs on numWorkers processes. With
+# opts.followIncludes every resolved include is compiled exactly once as well.
+# The results of jobs come first and in the same order as jobs, followed by
+# the included headers sorted by path, independent of the scheduling
+def compileBatch(jobs: T.List[T.Tuple[Path, Path]], opts: CompileOptions, numWorkers: int) -> T.List[CompileResult]:
+  opts = opts._replace(outputs={i: o for i, o in jobs})
+  known = {i for i, _ in jobs}
+  results: T.Dict[Path, CompileResult] = {}
+
+  # The include index: queue every header the first time it is seen
+  def discover(res: CompileResult) -> T.List[T.Tuple[Path, Path]]:
+    results[res.input] = res
+    new = [x for x in res.includes if x not in known]
+    known.update(new)
+    return [(x, outputFor(x, opts)) for x in new]
+
+  def size(fp: Path) -> int:
+    try:
+      return fp.stat().st_size
+    except OSError:
+      return 0
+
+  if numWorkers <= 1:
+    queue = list(jobs)
+    while queue:
+      queue += discover(compileJob(*queue.pop(0), opts))
+  else:
+    level = logging.getLogger().level
+    with concurrent.futures.ProcessPoolExecutor(numWorkers, initializer=initWorker, initargs=(level,)) as ex:
+      # Start the largest headers first for a better load balance
+      pending = {ex.submit(compileJob, *x, opts): x for x in sorted(jobs, key=lambda x: -size(x[0]))}
+      while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for f in done:
+          i, o = pending.pop(f)
+          try:
+            res = f.result()
+          except Exception as err:  # the worker process died
+            res = CompileResult(i, o, 0.0, f'{type(err).__name__}: {err}', 0, 0)
+
+          for x in discover(res):
+            pending[ex.submit(compileJob, *x, opts)] = x
+
+  shared = sorted(x for x in results if x not in opts.outputs)
+  return [results[i] for i, _ in jobs] + [results[x] for x in shared]
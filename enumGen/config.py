@@ -11,6 +11,16 @@ class Config:
     self.enableGetList   = True
     self.enableFromStr   = True
     self.bitfieldType    = 'uint64_t'
+    self.perfectHash     = False
+    self.useStringView   = False
+    self.constexprLists  = False
+    self.headerOnly      = False
+    self.stringPool      = False
+    self.detectBitfields = False
+
+    self.include:  T.List[str]                    = []  # only generate these enums (all if empty)
+    self.exclude:  T.List[str]                    = []
+    self.features: T.Dict[str, T.Dict[str, bool]] = {}  # selector --> overrides of enableFromStr, ...
 
     self.indent          = 2
     self.bitfieldConcat  = ' | '
@@ -26,6 +36,15 @@ class Config:
       'enableGetList': self.enableGetList,
       'enableFromStr': self.enableFromStr,
       'bitfieldType': self.bitfieldType,
+      'perfectHash': self.perfectHash,
+      'useStringView': self.useStringView,
+      'constexprLists': self.constexprLists,
+      'headerOnly': self.headerOnly,
+      'stringPool': self.stringPool,
+      'detectBitfields': self.detectBitfields,
+      'include': self.include,
+      'exclude': self.exclude,
+      'features': self.features,
       'indent': self.indent,
       'bitfieldConcat': self.bitfieldConcat,
       'defaultValue': self.defaultValue
@@ -48,6 +67,15 @@ class Config:
     self.enableBitfields = data.get('enableBitfields', self.enableBitfields)
     self.enableGetList   = data.get('enableGetList',   self.enableGetList)
     self.enableFromStr   = data.get('enableFromStr',   self.enableFromStr)
+    self.perfectHash     = data.get('perfectHash',     self.perfectHash)
+    self.useStringView   = data.get('useStringView',   self.useStringView)
+    self.constexprLists  = data.get('constexprLists',  self.constexprLists)
+    self.headerOnly      = data.get('headerOnly',      self.headerOnly)
+    self.stringPool      = data.get('stringPool',      self.stringPool)
+    self.detectBitfields = data.get('detectBitfields', self.detectBitfields)
+    self.include         = data.get('include',         self.include)
+    self.exclude         = data.get('exclude',         self.exclude)
+    self.features        = data.get('features',        self.features)
     self.indent          = data.get('indent',          self.indent)
     self.bitfieldConcat  = data.get('bitfieldConcat',  self.bitfieldConcat)
     self.defaultValue    = data.get('defaultValue',    self.defaultValue)
@@ -1,32 +1,237 @@
 import re
 import logging
+import functools
 import typing as T
+from enum import Enum
+from .parser import EventType
 
 if T.TYPE_CHECKING:
-  from .parser import Parser
+  from .parser import Parser, ScopeEvent
 
-  class EnumDict(T.TypedDict):
-    scope:     str
-    isScoped:  bool
-    name:      str
-    entries:   T.Dict[str, T.Union[str, int]]
-    blackList: T.List[str]
+EnumValue = T.Union[str, int]  # str if the value could not be evaluated
+
+minDenseSize = 4  # smaller runs of values are not worth a direct-index array
+
+# Lookups by value use a direct-index array for the largest run of unique
+# values without gaps of more than one value (at least half of the array is
+# used) and a binary search for all other values. Returns the first and last
+# value of that run, an empty range (1, 0) if no run is worth an array and
+# None if not all values are known integers of at most 64 bits
+def denseRange(values: T.List[EnumValue], duplicates: bytearray) -> T.Optional[T.Tuple[int, int]]:
+  unique = sorted(x for x, dup in zip(values, duplicates) if not dup and isinstance(x, int))
+  if len(unique) != duplicates.count(0):
+    return None
+  if unique and (unique[0] < -(1 << 63) or unique[-1] >= 1 << 64):
+    return None
+
+  best  = (1, 0)
+  start = 0
+  for i in range(1, len(unique) + 1):
+    if i == len(unique) or unique[i] - unique[i - 1] > 2:
+      if i - start >= minDenseSize and i - start > best[1] - best[0] + 1:
+        best = (unique[start], unique[i - 1])
+      start = i
+
+  return best
+
+class BitfieldKind(Enum):
+  FLAGS      = 1  # single bits (and zero)
+  MIXED      = 2  # single bits and masks of them, or values that are not known
+  SEQUENTIAL = 3  # anything else, bitwise decoding makes no sense
+
+# Runs of values from 0 that are shorter than this may still be flags
+# (NONE, FRONT, BACK, FRONT_AND_BACK)
+minSequentialRun = 5
+
+# Classifies the unique values of an enum. A largest value of all ones
+# (VK_..._MAX_ENUM = 0x7FFFFFFF) only forces the size of the enum and is
+# ignored, like all bits set (ALL = ~0 or -1). Unknown values are MIXED, so
+# the bitfield functions are kept
+def bitfieldKind(values: T.List[EnumValue], duplicates: bytearray) -> BitfieldKind:
+  unique = {x for x, dup in zip(values, duplicates) if not dup}
+  if any(not isinstance(x, int) for x in unique):
+    return BitfieldKind.MIXED
+
+  ints = T.cast(T.Set[int], unique)
+  top  = max(ints, default=0)
+  if top >= 0xFF and top & (top + 1) == 0:
+    ints.discard(top)
+  ints.discard(-1)
+
+  bits  = {x for x in ints if x > 0 and x & (x - 1) == 0}
+  masks = {x for x in ints if x > 0 and x & (x - 1) != 0}
+  if not bits or any(x < 0 for x in ints):
+    return BitfieldKind.SEQUENTIAL
+  if len(ints) >= minSequentialRun and ints == set(range(len(ints))):
+    return BitfieldKind.SEQUENTIAL
+  if not masks:
+    return BitfieldKind.FLAGS
+
+  allBits = functools.reduce(lambda a, b: a | b, bits)
+  if len(masks) <= len(bits) and all(x & ~allBits == 0 for x in masks):
+    return BitfieldKind.MIXED
+  return BitfieldKind.SEQUENTIAL
+
+# An enum and its entries, shared by the parser, the JSON files and the generator
+#
+# The entries are stored in parallel arrays: their names, their values and
+# a flag for every entry that has the value of an earlier entry (the
+# "blackList" in the JSON files).
+class EnumInfo:
+  __slots__ = ('scope', 'isScoped', 'name', 'names', 'values', 'duplicates', 'maxLen', 'dense', 'kind')
+
+  def __init__(self, scope: str, isScoped: bool, name: str, names: T.List[str], values: T.List[EnumValue], duplicates: bytearray) -> None:
+    self.scope      = scope
+    self.isScoped   = isScoped
+    self.name       = name
+    self.names      = names
+    self.values     = values
+    self.duplicates = duplicates
+    self.maxLen     = max(map(len, names), default=0)  # longest entry name
+    self.dense      = denseRange(values, duplicates)
+    self.kind       = bitfieldKind(values, duplicates)
+
+  # The name of the enum with its scope (test::TestClass::ABC)
+  @property
+  def qualifiedName(self) -> str:
+    return f'{self.scope}::{self.name}' if self.scope else self.name
+
+  # The names of all entries without the duplicates
+  def unique(self) -> T.Iterator[str]:
+    return (x for x, dup in zip(self.names, self.duplicates) if not dup)
+
+  def toJSON(self) -> T.Dict[str, T.Any]:
+    return {
+      'scope':     self.scope,
+      'isScoped':  self.isScoped,
+      'name':      self.name,
+      'entries':   dict(zip(self.names, self.values)),
+      'blackList': [x for x, dup in zip(self.names, self.duplicates) if dup],
+    }
+
+  # Raises KeyError, TypeError or ValueError if data is not a valid enum
+  @staticmethod
+  def fromJSON(data: T.Dict[str, T.Any]) -> 'EnumInfo':
+    entries = data['entries']
+    if not isinstance(entries, dict):
+      raise TypeError('entries must be a dict')
+
+    names = list(entries.keys())
+    index = {x: i for i, x in enumerate(names)}
+    dup   = bytearray(len(names))
+    for i in data['blackList']:
+      if i in index:
+        dup[index[i]] = 1
+
+    return EnumInfo(str(data['scope']), bool(data['isScoped']), str(data['name']), names, list(entries.values()), dup)
+
+_bodyRegex   = re.compile('(^[^{]+{)|(}[^}]*$)')
+_tokenRegex  = re.compile('[A-Za-z0-9_]+')
+_numberRegex = re.compile('(0[xX][0-9A-Fa-f]+|0[bB][01]+|0[0-7]*|[1-9][0-9]*)[uUlL]*')
+_opRegex     = re.compile(r'<<|>>|[-+*/%&|^~()]')
+
+# No enum has more than 64 bits, so larger shifts only waste memory
+def shiftLeft(a: int, b: int) -> int:
+  if not 0 <= b <= 64:
+    raise ValueError('invalid shift count')
+  return a << b
+
+# C division truncates towards zero
+def divide(a: int, b: int) -> int:
+  res = abs(a) // abs(b)
+  return res if (a < 0) == (b < 0) else -res
+
+# binary operators by C precedence (lowest first)
+_binaryOps: T.List[T.Dict[str, T.Callable[[int, int], int]]] = [
+  {'|': lambda a, b: a | b},
+  {'^': lambda a, b: a ^ b},
+  {'&': lambda a, b: a & b},
+  {'<<': shiftLeft, '>>': lambda a, b: a >> b},
+  {'+': lambda a, b: a + b, '-': lambda a, b: a - b},
+  {'*': lambda a, b: a * b, '/': divide, '%': lambda a, b: a - divide(a, b) * b},
+]
+
+_unaryOps: T.Dict[str, T.Callable[[int], int]] = {
+  '-': lambda a: -a,
+  '+': lambda a: a,
+  '~': lambda a: ~a,
+}
+
+# The value of a C integer literal without suffix
+def literal(text: str) -> int:
+  if text[:2] in ['0x', '0X', '0b', '0B']:
+    return int(text, 0)
+  return int(text, 8 if text.startswith('0') else 10)
+
+# Evaluates an integer constant expression (C literals and operators, without
+# whitespace). Returns None if expr is anything else.
+@functools.lru_cache(maxsize=4096)
+def evaluate(expr: str) -> T.Optional[int]:
+  tokens: T.List[T.Union[str, int]] = []
+  pos = 0
+  while pos < len(expr):
+    num = _numberRegex.match(expr, pos)
+    op  = _opRegex.match(expr, pos)
+    if num:
+      tokens += [literal(num.group(1))]
+      pos = num.end()
+    elif op:
+      tokens += [op.group()]
+      pos = op.end()
+    else:
+      return None
+
+  it = 0
+
+  def binary(level: int) -> int:
+    nonlocal it
+    if level == len(_binaryOps):
+      return unary()
+
+    res = binary(level + 1)
+    while it < len(tokens) and tokens[it] in _binaryOps[level]:
+      op = _binaryOps[level][T.cast(str, tokens[it])]
+      it += 1
+      res = op(res, binary(level + 1))
+    return res
+
+  def unary() -> int:
+    nonlocal it
+    if it >= len(tokens):
+      raise ValueError('unexpected end')
+
+    tok = tokens[it]
+    it += 1
+    if isinstance(tok, int):
+      return tok
+    if tok in _unaryOps:
+      return _unaryOps[tok](unary())
+    if tok == '(':
+      res = binary(0)
+      if it >= len(tokens) or tokens[it] != ')':
+        raise ValueError('expected )')
+      it += 1
+      return res
+
+    raise ValueError(f'unexpected {tok}')
+
+  try:
+    res = binary(0)
+  except (ValueError, ZeroDivisionError, RecursionError):
+    return None
+
+  return res if it == len(tokens) else None
 
 class Enums:
   def __init__(self) -> None:
-    self.enums: T.List['EnumDict'] = []
-
-  def addEnum(self, scope: str, isScoped: bool, name: str, entries: T.Dict[str, T.Union[str, int]], blackList: T.List[str]) -> None:
-    self.enums += [{
-      'scope':     scope,
-      'isScoped':  isScoped,
-      'name':      name,
-      'entries':   entries,
-      'blackList': blackList,
-    }]
-    logging.info(f'Found enum "{name}" with {len(entries)} entries with {len(blackList)} duplicates detected')
-
-  def parseEnum(self, raw: str, scope: str) -> None:
+    self.enums: T.List[EnumInfo] = []
+
+  def makeEnum(self, scope: str, isScoped: bool, name: str, names: T.List[str], values: T.List[EnumValue], duplicates: bytearray) -> EnumInfo:
+    res = EnumInfo(scope, isScoped, name, names, values, duplicates)
+    logging.info(f'Found enum "{name}" with {len(names)} entries with {duplicates.count(1)} duplicates detected ({res.kind.name.lower()})')
+    return res
+
+  def parseEnum(self, raw: str, scope: str) -> T.Optional[EnumInfo]:
     # Get name and scope
     decl = re.sub('{[^}]*}', '', raw)  # remove the enum entries
 
@@ -41,71 +246,87 @@ class Enums:
 
     if not nameList:
       logging.warning('Could not determine the name of the enum --> skipping')
-      return
+      return None
 
     name = nameList[0] if (not isTypedef) else nameList[-1]
 
     ### Parse the enum body
-    body_str = re.sub('(^[^{]+{)|(}[^}]*$)', '', raw)  # only the enum body
-    body_str = re.sub(' ', '', body_str)
+    body_str = _bodyRegex.sub('', raw)  # only the enum body
+    body_str = body_str.replace(' ', '')
     body = body_str.split(',')
 
     ### Calculate enum values
-    enums: T.Dict[str, T.Union[str, int]] = {}
+    names:  T.List[str]       = []
+    values: T.List[EnumValue] = []
+    index:  T.Dict[str, int]  = {}  # entry --> position in names
+    byValue: T.Dict[EnumValue, T.List[str]] = {}  # value --> entries with this value
+    duplicates = bytearray()
     nextValue = 0
-    blackList = []
+
+    def resolve(m: T.Match[str]) -> str:
+      return str(values[index[m.group()]]) if m.group() in index else m.group()
 
     for i in body:
-      en = re.sub('=.*', '', i)
-      value: T.Union[str, int] = nextValue
+      en = i.split('=', 1)[0]
+      value: EnumValue = nextValue
       nextValue += 1
 
       if not en:
         continue
 
       if ('=' in i):
-        val = re.sub('.*=', '', i)
-
-        # check for known values
-        splitList = re.split('[^A-Za-z0-9_]', val)
-        for j in splitList:
-          if (j in enums.keys()):
-            val = val.replace(j, '{}'.format(enums[j]))
-
-        # check input before eval --> remove all legal strings and then check if empty
-        temp = val
-        for j in ['0x[0-9A-Fa-f]+', '0b[01]+', '[0-9]', '[()\\+\\-\\*\\/]', '<<', '>>']:
-          temp = re.sub(j, '', temp)
-
-        if len(temp) == 0:
-          value = eval(val)
-          assert isinstance(value, int)
+        # replace known entries with their values
+        val = _tokenRegex.sub(resolve, i.rsplit('=', 1)[1])
+        num = evaluate(val)
+
+        if num is not None:
+          value = num
           nextValue = value + 1
         else:
           value = val
 
-      if (value in enums.values()):
-        blackList.append(en)
+      isDuplicate = value in byValue
 
-      enums[en] = value
+      if en not in index:
+        index[en] = len(names)
+        names.append(en)
+        values.append(value)
+        duplicates.append(0)
+      else:
+        # redefined entry
+        old = values[index[en]]
+        byValue[old].remove(en)
+        if not byValue[old]:
+          del byValue[old]
+        values[index[en]] = value
 
-    self.addEnum(scope, isClass, name, enums, blackList)
+      if isDuplicate:
+        duplicates[index[en]] = 1
 
-  def parseScope(self, parser: 'Parser') -> bool:
-    scopeStack: T.List[str] = []
-    li = parser.getResult()
-    for i in li:
-      if (i == '#!POP_SCOPE'):
+      byValue.setdefault(value, []).append(en)
+
+    return self.makeEnum(scope, isClass, name, names, values, duplicates)
+
+  # Generates the enums as soon as they are found in the events. scopeStack
+  # holds the current scope and is empty again if all scopes were closed
+  def iterScope(self, events: T.Iterable['ScopeEvent'], scopeStack: T.List[str]) -> T.Iterator[EnumInfo]:
+    for i in events:
+      if (i.type == EventType.POP_SCOPE):
         scopeStack.pop()
         continue
 
-      if (re.match('#!PUSH_SCOPE=', i)):
-        sc = re.sub('^#!PUSH_SCOPE=', '', i)
-        scopeStack.append(sc)
+      if (i.type == EventType.PUSH_SCOPE):
+        scopeStack.append(i.value)
         continue
 
       scope = '::'.join(scopeStack)
-      self.parseEnum(i, scope)
+      enum = self.parseEnum(i.value, scope)
+      if enum is not None:
+        yield enum
+
+  def parseScope(self, parser: 'Parser') -> bool:
+    scopeStack: T.List[str] = []
+    self.enums += self.iterScope(parser.getResult(), scopeStack)
 
     if scopeStack:
       logging.warning('Parsing error: scope stack not empty')
@@ -2,30 +2,414 @@ import re
 import logging
 import os
 import textwrap
+import json
+import concurrent.futures
 from pathlib import Path
 import typing as T
+from .output import updateFile
+from . import perfecthash
+from .selection import Selection, Features
+from .enums import BitfieldKind
 
 if T.TYPE_CHECKING:
   from .config import Config
-  from .enums  import EnumDict
+  from .enums  import EnumInfo
+  from .cache  import FragmentCache
+
+# The generated names of an enum (depend on the config)
+class EnumIds(T.NamedTuple):
+  info:     'EnumInfo'
+  id:       str  # qualified name without the config namespace
+  fname:    str  # id as part of a function name
+  prefix:   str  # qualifies the entries
+  features: Features  # the config flags with the overrides for this enum
+
+# The templates are dedented once, the placeholders are filled in by str.format
+
+_hppHeader = textwrap.dedent('''\
+  /*!
+   * \\file {hpp}
+   * \\warning This is an automatically generated file!
+   */
+
+  // clang-format off
+
+  #pragma once
+
+  #include <string>
+  #include <string_view>
+  #include <vector>
+''')
+
+_cppHeader = textwrap.dedent('''\
+  /*!
+   * \\file {cpp}
+   * \\warning This is an automatically generated file!
+   */
+
+  // clang-format off
+
+  #include "{hpp}"
+
+  ''')
+
+_fnvHash = textwrap.dedent('''
+  namespace {
+    const size_t FNV1A_BASE  = 2166136261;
+    const size_t FNV1A_PRIME = 16777619;
+
+    inline size_t fnv1aHash(const char *data) {
+      size_t hash = FNV1A_BASE;
+      while (*data != 0) {
+        hash ^= static_cast<size_t>(*(data++));
+        hash *= FNV1A_PRIME;
+      }
+      return hash;
+    }
+
+    constexpr size_t fnv1aHash(const char *data, size_t n) {
+      size_t hash = FNV1A_BASE;
+      for (size_t i = 0; i < n; ++i) {
+        hash ^= static_cast<size_t>(data[i]);
+        hash *= FNV1A_PRIME;
+      }
+      return hash;
+    }
+
+    size_t fnv1aHash(std::string_view _str) { return fnv1aHash(_str.data(), _str.size()); }
+
+    constexpr size_t operator"" _h(char const *data, size_t n) { return fnv1aHash(data, n); }
+  }
+
+  ''')
+
+# The hash functions of the header only mode, in the detail namespace
+_fnvHashHeader = textwrap.dedent('''
+  namespace {ns}{{
+    constexpr size_t fnv1aHash(std::string_view _str) {{
+      size_t hash = 2166136261u;
+      for (char c : _str) {{
+        hash ^= static_cast<size_t>(c);
+        hash *= 16777619u;
+      }}
+      return hash;
+    }}
+  }}
+
+  ''')
+
+_phHash = textwrap.dedent('''
+  namespace {ns}{{
+    constexpr uint32_t phHash(std::string_view _str, uint32_t _seed) {{
+      uint32_t hash = 2166136261u ^ _seed;
+      for (char c : _str) {{
+        hash ^= static_cast<uint8_t>(c);
+        hash *= 16777619u;
+      }}
+      return hash;
+    }}
+
+    constexpr uint32_t phMix(uint32_t _hash, uint32_t _d) {{
+      _hash ^= _d * 0x9E3779B9u;
+      _hash ^= _hash >> 16;
+      _hash *= 0x85EBCA6Bu;
+      return _hash ^ (_hash >> 13);
+    }}
+
+    template <typename E>
+    struct PHEntry {{
+      {nameType} name;
+      E                value;
+    }};
+  }}
+
+  ''')
+
+_toStrFunc = textwrap.dedent('''
+
+  /*!
+   * \\brief Converts the enum {id} to a std::string
+   * \\param _var The enum value to convert
+   * \\returns _var converted to a std::string
+   */
+  {spec}std::string {cls}::{func}( {id} _var ) noexcept {{
+  {i1}switch( _var ) {{
+  ''')
+
+_toStrViewFunc = textwrap.dedent('''
+
+  /*!
+   * \\brief Converts the enum {id} to a std::string_view
+   * \\param _var The enum value to convert
+   * \\returns _var converted to a std::string_view of a static string
+   */
+  {spec}std::string_view {cls}::{func}( {id} _var ) noexcept {{
+  ''')
+
+# The lookups following the tables of _toStrViewFunc
+_denseLookup = textwrap.dedent('''
+  {i1}uint64_t index = static_cast<uint64_t>(_var){offset};
+  {i1}if( index < {size} && {check} ) {{
+  {i2}return {result};
+  {i1}}}
+  ''')
+
+# A binary search in the sorted values (std::lower_bound is not constexpr in C++17)
+_sparseLookup = textwrap.dedent('''
+  {i1}size_t first = 0;
+  {i1}size_t last  = {size};
+  {i1}while( first < last ) {{
+  {i2}size_t mid = (first + last) / 2;
+  {i2}if( {values}[mid] < _var ) {{
+  {i2}{i1}first = mid + 1;
+  {i2}}} else {{
+  {i2}{i1}last = mid;
+  {i2}}}
+  {i1}}}
+  {i1}if( first < {size} && {values}[first] == _var ) {{
+  {i2}return {result};
+  {i1}}}
+  ''')
+
+_fromStrFunc = textwrap.dedent('''
+
+  /*!
+  * \\brief Converts the std::string_view to an {id} enum
+  * \\param _var The string to convert
+  * \\returns _var converted to {id} or static_cast<{id}>(-1) if there was no match
+  */
+  {spec}{id} {cls}::{fname}_fromStr( std::string_view _var ) noexcept {{
+  {i1}switch( {d}fnv1aHash(_var) ) {{
+  ''')
+
+_fromStrPHFunc = textwrap.dedent('''
+
+  /*!
+  * \\brief Converts the std::string_view to an {id} enum
+  * \\param _var The string to convert
+  * \\returns _var converted to {id} or static_cast<{id}>(-1) if there was no match
+  */
+  {spec}{id} {cls}::{fname}_fromStr( std::string_view _var ) noexcept {{
+  ''')
+
+# The lookup following the tables of _fromStrPHFunc
+_fromStrPHLookup = textwrap.dedent('''
+  {i1}uint32_t hash = {d}phHash(_var, {seed}u);
+  {i1}uint32_t slot = {d}phMix(hash, {displacements}[hash % {numBuckets}]) % {numSlots};
+  {i1}if( {match} ) {{
+  {i2}return {table}[slot].value;
+  {i1}}}
+  {i1}return static_cast<{id}>(-1);
+  }}''')
+
+_stringListFunc = textwrap.dedent('''
+
+  /*!
+  * \\brief Converts the list of strings to one string concatinated with '{concat}'
+  * \\param _list The list of strings to convert
+  * \\returns The converted _list
+  */
+  {spec}std::string {cls}::stringListToString(std::vector<std::string> _list) noexcept {{
+    std::string lResult;
+    for( size_t i = 0; i < _list.size(); ++i ) {{
+      if( i != 0 ) {{
+        lResult += "{concat}";
+      }}
+
+      lResult += _list[i];
+    }}
+    return lResult;
+  }}
+
+  ''')
+
+_bitHelpers = textwrap.dedent('''
+  namespace {ns}{{
+    inline int countTrailingZeros(uint64_t _x) {{
+  #if defined(__GNUC__) || defined(__clang__)
+      return __builtin_ctzll(_x);
+  #elif defined(_MSC_VER)
+      unsigned long i;
+      _BitScanForward64(&i, _x);
+      return static_cast<int>(i);
+  #else
+      int i = 0;
+      for( ; (_x & 1) == 0; _x >>= 1 ) {{
+        ++i;
+      }}
+      return i;
+  #endif
+    }}
+
+    // Joins names with '{concat}' into a caller provided buffer like snprintf
+    class BitfieldBuffer {{
+     public:
+      BitfieldBuffer(char *_buf, size_t _size) : buf(_buf), size(_size) {{}}
+
+      void append(std::string_view _name) noexcept {{
+        if( len > 0 ) {{
+          put("{concat}");
+        }}
+        put(_name);
+      }}
 
-  class PocEnumDict(EnumDict):
-    maxLen: int
-    id:     str
-    fname:  str
+      size_t finish() noexcept {{
+        if( size > 0 ) {{
+          buf[std::min(len, size - 1)] = '\\0';
+        }}
+        return len;
+      }}
+
+     private:
+      void put(std::string_view _str) noexcept {{
+        if( len < size ) {{
+          std::memcpy(buf + len, _str.data(), std::min(_str.size(), size - len));
+        }}
+        len += _str.size();
+      }}
+
+      char * buf;
+      size_t size;
+      size_t len = 0;
+    }};
+  }}
+  ''')
+
+# All names in one array of strings, referenced by offset (row << 16 | offset
+# in the row) and size. Tables of PoolRefs need no relocations, unlike tables
+# of pointers to string literals
+_namePool = textwrap.dedent('''
+  namespace {detail} {{
+    struct PoolRef {{
+      uint32_t offset;
+      uint32_t size;
+    }};
+
+  {pool}
+    {spec}std::string_view poolName(PoolRef _ref) noexcept {{
+      return std::string_view(namePool[_ref.offset >> 16] + (_ref.offset & 0xFFFF), _ref.size);
+    }}
+  }}
+  ''')
+
+# MSVC limits a string literal (after concatenation) to 64 KiB including the
+# terminating zero, so every row of the string pool is one literal of at most
+# this size
+maxPoolRow = 0xFFFF
+
+# Calls _f with the names of all masks in _var: the widest composite masks
+# first, then the set bits from the lowest. Zero is only named if _var is zero
+_forEachNameFunc = textwrap.dedent('''
+
+  template <typename F>
+  {spec}void {fname}_forEachName( uint64_t _var, F &&_f ) {{
+  ''')
+
+_bitFuncs = textwrap.dedent('''
+
+  /*!
+   * \\brief Converts the enum bitfield {id} into a caller provided buffer (never allocates)
+   * \\param _var  The bitfield value to convert
+   * \\param _buf  The buffer for the null-terminated string
+   * \\param _size The size of _buf
+   * \\returns The length of the complete string (like snprintf, the output was truncated if it is >= _size)
+   */
+  {spec}size_t {cls}::{fname}_{func}( {btype} _var, char *_buf, size_t _size ) noexcept {{
+  {i1}{d}BitfieldBuffer buf(_buf, _size);
+  {i1}{d}{fname}_forEachName(static_cast<uint64_t>(_var), [&](std::string_view _name) {{ buf.append(_name); }});
+  {i1}return buf.finish();
+  }}
+
+  /*!
+   * \\brief Converts the enum bitfield {id} to a std::string
+   * \\param _var The bitfield value to convert
+   * \\returns The _var bitfield converted to a std::string
+   */
+  {spec}std::string {cls}::{fname}_{func}( {btype} _var ) noexcept {{
+  {i1}std::string res;
+  {i1}{d}{fname}_forEachName(static_cast<uint64_t>(_var), [&](std::string_view _name) {{
+  {i2}if( !res.empty() ) {{
+  {i2}{i1}res += "{concat}";
+  {i2}}}
+  {i2}res += _name;
+  {i1}}});
+  {i1}return res;
+  }}
+
+  /*!
+   * \\brief Converts the enum bitfield {id} to std::vector of std::string
+   * \\param _var The bitfield value to convert
+   * \\returns _var converted to a std::vector of std::string
+   */
+  {spec}std::vector<std::string> {cls}::{fname}_{func}_Raw( {btype} _var ) noexcept {{
+  {i1}std::vector<std::string> list;
+  {i1}{d}{fname}_forEachName(static_cast<uint64_t>(_var), [&](std::string_view _name) {{ list.emplace_back(_name); }});
+  {i1}return list;
+  }}''')
+
+_getAllFunc = textwrap.dedent('''
+
+  /*!
+   * \\brief Retrieves all unique values of {id}
+   * \\returns a std::vector<{id}> of all unique values
+   */
+  {spec}std::vector<{id}> {cls}::getAll_{fname}() noexcept {{
+  {i1}return {{
+  ''')
+
+# The smallest unsigned integer type for values up to x
+def uintType(x: int) -> str:
+  for i in [8, 16, 32]:
+    if x < 1 << i:
+      return f'uint{i}_t'
+  return 'uint64_t'
+
+# The generator of a worker process (see Generator.render)
+_worker: T.Optional['Generator'] = None
+
+def initWorker(gen: 'Generator', level: int) -> None:
+  global _worker
+  _worker = gen
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=level)
+
+def renderJob(index: int) -> T.List[str]:
+  assert _worker is not None
+  return _worker.enumDefinitions(_worker.enums[index])
 
 class Generator:
-  def __init__(self, hppFile: Path, cppFile: Path, cfg: 'Config', name: str) -> None:
+  # The definitions of the enums are split into numShards source files next
+  # to cppFile if numShards > 0 or into one per enum list with shardPerInput.
+  # cppFile then only has the definitions that do not belong to an enum.
+  # The enums are rendered on numJobs processes if numJobs > 1 and only if
+  # they are not in the cache
+  def __init__(self, hppFile: Path, cppFile: Path, cfg: 'Config', name: str, numShards: int = 0, shardPerInput: bool = False,
+               numJobs: int = 1, cache: T.Optional['FragmentCache'] = None) -> None:
     self.cfg      = cfg
     self.name     = name
     self.maxIdLen = 0
     self.hppFile  = hppFile.resolve()
     self.cppFile  = cppFile.resolve()
-    self.incList:   T.List[str]           = []
-    self.enums_raw: T.List['EnumDict']    = []
-    self.enums:     T.List['PocEnumDict'] = []
-
-  def addEnums(self, incFile: str, enums: T.List['EnumDict']) -> None:
+    self.detail   = f'{name}_detail'  # namespace of the helpers in the header only mode
+    self.d        = f'{self.detail}::' if cfg.headerOnly else ''
+    self.names    = {'cls': name, 'func': cfg.funcName, 'btype': cfg.bitfieldType, 'i1': self.indent(1), 'd': self.d}
+    self.numShards     = numShards
+    self.shardPerInput = shardPerInput
+    self.numJobs       = numJobs
+    self.cache         = cache
+    self.pool: T.Dict[str, int] = {}  # name --> offset in the string pool (set by write)
+    self.shardFiles: T.List[Path]              = []  # set by write
+    self.sources:    T.List[T.Tuple[str, int]] = []  # (source, number of enums) of every enum list
+    self.incList:    T.List[str]               = []
+    self.enums_raw:  T.List['EnumInfo']        = []
+    self.enums:      T.List[EnumIds]           = []
+    self.selection = Selection(cfg)
+    self.enabled   = self.selection.default  # the config flags or the features of any enum (set by write)
+
+  # source names the shard of the enums (default: incFile). Only the enums
+  # selected by the config are added
+  def addEnums(self, incFile: str, enums: T.List['EnumInfo'], source: T.Optional[str] = None) -> None:
+    enums = [x for x in enums if self.selection.selected(x.qualifiedName)]
+    self.sources.append((source or incFile, len(enums)))
     if len(enums) > 0:
       self.incList.append(incFile)
       self.enums_raw += enums
@@ -36,315 +420,609 @@ class Generator:
     else:
       return ''
 
-  def genHpp(self) -> str:
-    raw_str = textwrap.dedent(f'''\
-      /*!
-       * \\file {self.hppFile.name}
-       * \\warning This is an automatically generated file!
-       */
-
-      // clang-format off
-
-      #pragma once
-
-      #include <string>
-      #include <string_view>
-      #include <vector>
-    ''')
+  # The definitions are only written to the header in the header only mode.
+  # Everything they define is either constexpr or inline there
+  def spec(self, constexpr: bool) -> str:
+    if not self.cfg.headerOnly:
+      return ''
+    return 'constexpr ' if constexpr else 'inline '
+
+  # The standard headers of the definitions
+  def genIncludes(self, fp: T.TextIO) -> None:
+    includes: T.Set[str] = set()
+    if self.cfg.useStringView or self.cfg.stringPool:
+      includes |= {'cstdint'}
+    if self.enabled.fromStr and self.cfg.perfectHash:
+      includes |= {'cstdint', 'cstring'}
+    if self.enabled.bitfields:
+      includes |= {'algorithm', 'cstdint', 'cstring'}
+    if includes:
+      fp.write(''.join(f'#include <{x}>\n' for x in sorted(includes)) + '\n')
+    if self.enabled.bitfields:
+      fp.write('#if defined(_MSC_VER) && !defined(__clang__)\n#include <intrin.h>\n#endif\n\n')
+
+  def genHpp(self, fp: T.TextIO, rendered: T.Optional[T.Sequence[T.List[str]]] = None) -> None:
+    fp.write(_hppHeader.format(hpp=self.hppFile.name))
+    if self.enabled.getList and self.cfg.constexprLists:
+      fp.write('#include <array>\n')
+    if self.cfg.headerOnly:
+      fp.write('\n')
+      self.genIncludes(fp)
 
     for inc in self.incList:
-      raw_str += f'#include "{inc}"\n'
+      fp.write(f'#include "{inc}"\n')
 
     ### Open namespace
     if self.cfg.namespace:
-      raw_str += f'\nnamespace {self.cfg.namespace} {{\n'
+      fp.write(f'\nnamespace {self.cfg.namespace} {{\n')
 
     ### Begin class / namespace
     if self.cfg.useNamespace:
-      raw_str += f'\nnamespace {self.name} {{\n\n'
+      fp.write(f'\nnamespace {self.name} {{\n\n')
       baseLevel = 1
       static = ''
     else:
       baseLevel = 2
       static = 'static '
-      raw_str += f'\nclass {self.name} final {{\n'
-      raw_str += self.indent(1) + 'public:\n'
-      raw_str += self.indent(2) + f'{self.name}() = delete;\n\n'
+      fp.write(f'\nclass {self.name} final {{\n')
+      fp.write(self.indent(1) + 'public:\n')
+      fp.write(self.indent(2) + f'{self.name}() = delete;\n\n')
 
-    # To string declarations
+    ind   = self.indent(baseLevel) + static
+    inl   = ind + self.spec(False)
     fName = self.cfg.funcName
+    btype = self.cfg.bitfieldType
+
+    def pad(x: str) -> str:
+      return ' ' * (self.maxIdLen - len(x))
+
+    # To string declarations
+    strType = 'std::string_view' if self.cfg.useStringView else 'std::string'
     for i in self.enums:
-      pad = ' ' * (self.maxIdLen - len(i['id']))
-      raw_str += self.indent(baseLevel) + f'{static}std::string {fName}( {i["id"]}{pad} _var ) noexcept;\n'
+      fp.write(f'{ind}{self.spec(self.cfg.useStringView)}{strType} {fName}( {i.id}{pad(i.id)} _var ) noexcept;\n')
 
     # From string declarations
-    if self.cfg.enableFromStr:
-      raw_str += '\n\n'
-      for i in self.enums:
-        pad_name = ' ' * (self.maxIdLen - len(i['fname']))
-        pad_id   = ' ' * (self.maxIdLen - len(i['id']))
-        raw_str += self.indent(baseLevel) + f'{static}{i["id"]}{pad_id} {i["fname"]}_fromStr{pad_name} ( std::string_view _var ) noexcept;\n'
+    if self.enabled.fromStr:
+      fp.write('\n\n')
+      for i in (x for x in self.enums if x.features.fromStr):
+        fp.write(f'{ind}{self.spec(True)}{i.id}{pad(i.id)} {i.fname}_fromStr{pad(i.fname)} ( std::string_view _var ) noexcept;\n')
 
     # Handle bitfields
-    if self.cfg.enableBitfields:
-      raw_str += '\n\n' + self.indent(baseLevel)
-      raw_str += f'{static}std::string stringListToString(std::vector<std::string> _list) noexcept;\n\n'
+    if self.enabled.bitfields:
+      fp.write('\n\n' + inl + 'std::string stringListToString(std::vector<std::string> _list) noexcept;\n\n')
+
+      bitfields = [x for x in self.enums if x.features.bitfields]
+      for i in bitfields:
+        fp.write(f'{inl}std::string {i.fname}_{fName} {pad(i.fname)}( {btype} _var ) noexcept;\n')
 
-      btype = self.cfg.bitfieldType
+      fp.write('\n\n')
 
-      for i in self.enums:
-        pad = ' ' * (self.maxIdLen - len(i['fname']))
-        bitName = f'{i["fname"]}_{fName} {pad}'
-        raw_str += self.indent(baseLevel) + f'{static}std::string {bitName}( {btype} _var ) noexcept;\n'
+      for i in bitfields:
+        fp.write(f'{inl}size_t {i.fname}_{fName} {pad(i.fname)}( {btype} _var, char *_buf, size_t _size ) noexcept;\n')
 
-      raw_str += '\n\n'
+      fp.write('\n\n')
 
-      for i in self.enums:
-        pad = ' ' * (self.maxIdLen - len(i['fname']))
-        bitName = f'{i["fname"]}_{fName}_Raw {pad}'
-        raw_str += self.indent(baseLevel) + f'{static}std::vector<std::string> {bitName}( {btype} _var ) noexcept;\n'
+      for i in bitfields:
+        fp.write(f'{inl}std::vector<std::string> {i.fname}_{fName}_Raw {pad(i.fname)}( {btype} _var ) noexcept;\n')
 
     # List of enum values
-    if self.cfg.enableGetList:
-      raw_str += '\n\n'
-      for i in self.enums:
-        pad_name = ' ' * (self.maxIdLen - len(i['fname']))
-        pad_id   = ' ' * (self.maxIdLen - len(i['id']))
-        bitName = f'getAll_{i["fname"]} {pad_name}'
-        raw_str += self.indent(baseLevel) + f'{static}std::vector< {i["id"]}{pad_id} > {bitName}() noexcept;\n'
+    if self.enabled.getList and self.cfg.constexprLists:
+      self.constexprLists(fp, baseLevel)
+    elif self.enabled.getList:
+      fp.write('\n\n')
+      for i in (x for x in self.enums if x.features.getList):
+        fp.write(f'{inl}std::vector< {i.id}{pad(i.id)} > getAll_{i.fname} {pad(i.fname)}() noexcept;\n')
 
     ### End class namespace
     if self.cfg.useNamespace:
-      raw_str += f'\n}} // namespace {self.name}\n\n'
+      fp.write(f'\n}} // namespace {self.name}\n\n')
     else:
-      raw_str += f'\n}}; // class {self.name}\n\n'
+      fp.write(f'\n}}; // class {self.name}\n\n')
+
+    if self.cfg.headerOnly:
+      self.genDefinitions(fp, self.enums, True, rendered)
+      fp.write('\n\n')
 
     ### Close namespace
     if self.cfg.namespace:
-      raw_str += f'}} // namespace {self.cfg.namespace} \n\n'
-    return raw_str + '// clang-format on\n\n'
-
-  def genCpp(self) -> str:
-    raw_str = textwrap.dedent(f'''\
-      /*!
-       * \\file {self.cppFile.name}
-       * \\warning This is an automatically generated file!
-       */
+      fp.write(f'}} // namespace {self.cfg.namespace} \n\n')
+    fp.write('// clang-format on\n\n')
+
+  # The unique values of every enum as a constexpr std::array in the header,
+  # returned by reference from getAll_, and their number
+  def constexprLists(self, fp: T.TextIO, baseLevel: int) -> None:
+    ind  = self.indent(baseLevel)
+    ind2 = self.indent(baseLevel + 1)
+    var  = 'inline constexpr' if self.cfg.useNamespace else 'static constexpr'
+    func = 'constexpr' if self.cfg.useNamespace else 'static constexpr'
+    lists = [x for x in self.enums if x.features.getList]
+    pad  = max((len(x.fname) for x in lists), default=0)
+
+    fp.write('\n\n')
+    for i in lists:
+      fp.write(f'{ind}{var} size_t {i.fname}_count{" " * (pad - len(i.fname))} = {i.info.duplicates.count(0)};\n')
+
+    for i in lists:
+      array = f'std::array<{i.id}, {i.fname}_count>'
+      out = [f'\n{ind}{var} {array} {i.fname}_values = {{{{\n']
+      out += [f'{ind2}{i.prefix}{j},\n' for j in i.info.unique()]
+      out += [f'{ind}}}}};\n{ind}{func} const {array} &getAll_{i.fname}() noexcept {{ return {i.fname}_values; }}\n']
+      fp.write(''.join(out))
+
+  def genCpp(self, fp: T.TextIO, cppFile: Path, enums: T.Sequence[EnumIds], common: bool = True,
+             rendered: T.Optional[T.Sequence[T.List[str]]] = None) -> None:
+    fp.write(_cppHeader.format(cpp=cppFile.name, hpp=self.hppFile.name, btype=self.cfg.bitfieldType))
+    if self.cfg.headerOnly:
+      fp.write('// Everything is defined in the header\n\n// clang-format on\n\n')
+      return
+
+    if enums:
+      self.genIncludes(fp)
+    if self.cfg.namespace:
+      fp.write(f'using namespace {self.cfg.namespace};\n\n')
+
+    self.genDefinitions(fp, enums, common, rendered)
+    fp.write('\n\n// clang-format on\n\n')
+
+  # Writes the definitions of enums, section by section (see enumDefinitions).
+  # The definitions that do not belong to an enum are only written if common
+  # is set. Every function is rendered into one string and written right
+  # away, so only the output of one enum is held in memory, unless rendered
+  # already holds the enumDefinitions of all enums
+  def genDefinitions(self, fp: T.TextIO, enums: T.Sequence[EnumIds], common: bool = True,
+                     rendered: T.Optional[T.Sequence[T.List[str]]] = None) -> None:
+    ns       = f'{self.detail} ' if self.cfg.headerOnly else ''
+    sections = self.sections()
+
+    if self.cfg.stringPool and (enums or common):
+      self.genPool(fp, common)
+
+    for k, section in enumerate(sections):
+      # The helpers of the section
+      if k == 0 and enums and self.enabled.fromStr and self.cfg.perfectHash:
+        fp.write(_phHash.format(ns=ns, nameType=self.nameType()))
+      elif k == 0 and enums and self.enabled.fromStr:
+        fp.write(_fnvHashHeader.format(ns=ns) if self.cfg.headerOnly else _fnvHash)
+      elif k == 2 and self.enabled.bitfields:
+        if common:
+          fp.write(_stringListFunc.format(concat=self.cfg.bitfieldConcat, spec=self.spec(False), **self.names))
+        if enums:
+          fp.write(_bitHelpers.format(ns=ns, concat=self.cfg.bitfieldConcat))
+      elif k == 3 and self.enabled.getList and not self.cfg.constexprLists:
+        fp.write('\n\n\n')
+
+      for n, i in enumerate(enums):
+        fp.write(rendered[n][k] if rendered is not None else section(i))
+
+  # The functions rendering the definitions of an enum: toStr, fromStr,
+  # the bitfield functions and getAll
+  def sections(self) -> T.List[T.Callable[[EnumIds], str]]:
+    return [self.toStrDef, self.fromStrDef, self.bitfieldDef, self.getAllDef]
+
+  def enumDefinitions(self, i: EnumIds) -> T.List[str]:
+    return [x(i) for x in self.sections()]
+
+  # The names used by the functions of the enums, each once, in the order of
+  # their first use. A name that does not fit into the current row starts the
+  # next one
+  def buildPool(self) -> T.Dict[str, int]:
+    pool: T.Dict[str, int] = {}
+    row  = 0
+    size = 0
+    for i in self.enums:
+      used = i.info.names if i.features.fromStr and self.cfg.perfectHash else i.info.unique()
+      for j in used:
+        if j not in pool:
+          if size > 0 and size + len(j) >= maxPoolRow:
+            row += 1
+            size = 0
+          pool[j] = row << 16 | size
+          size += len(j)
+    return pool
+
+  # The string pool is defined once: in the header in the header only mode,
+  # otherwise in the source file with the common definitions
+  def genPool(self, fp: T.TextIO, define: bool) -> None:
+    i1 = self.indent(1)
+    i2 = self.indent(2)
+    rows: T.List[T.List[str]] = [[]]
+    for j, offset in self.pool.items():
+      rows += [[] for _ in range(len(rows), (offset >> 16) + 1)]
+      rows[offset >> 16] += [j]
+
+    dims = f'[{len(rows)}][{max(sum(len(j) for j in x) for x in rows) + 1}]'
+    if self.cfg.headerOnly:
+      pool = [f'{i1}inline constexpr char namePool{dims} = {{\n']
+    elif define:
+      pool = [f'{i1}extern const char namePool{dims};\n{i1}const char namePool{dims} = {{\n']
+    else:
+      pool = [f'{i1}extern const char namePool{dims};\n']
 
-      // clang-format off
+    if define or self.cfg.headerOnly:
+      for x in rows:
+        pool += [f'{i2}"{j}"\n' for j in x] if x else [f'{i2}""\n']
+        pool[-1] = pool[-1][:-1] + ',\n'
+      pool += [f'{i1}}};\n']
 
-      #include "{self.hppFile.name}"
+    spec = 'constexpr ' if self.cfg.headerOnly else 'inline '
+    fp.write(_namePool.format(detail=self.detail, pool=''.join(pool), spec=spec))
 
-      #define CHECK_BIT(v, x) (v & static_cast<{self.cfg.bitfieldType}>(x)) == static_cast<{self.cfg.bitfieldType}>(x)
+  # A name in a table: a string literal or a reference into the string pool
+  def nameRef(self, j: str) -> str:
+    if not self.cfg.stringPool:
+      return f'"{j}"'
+    return f'{{ {self.pool[j] if j else 0}, {len(j)} }}'
 
-      ''')
+  # The std::string_view of a name
+  def nameView(self, j: str) -> str:
+    return self.poolName(self.nameRef(j)) if self.cfg.stringPool else f'"{j}"'
 
-    if self.cfg.namespace:
-      raw_str += f'using namespace {self.cfg.namespace};\n\n'
-
-    if self.cfg.enableFromStr:
-      raw_str += textwrap.dedent('''
-        namespace {
-          const size_t FNV1A_BASE  = 2166136261;
-          const size_t FNV1A_PRIME = 16777619;
-
-          inline size_t fnv1aHash(const char *data) {
-            size_t hash = FNV1A_BASE;
-            while (*data != 0) {
-              hash ^= static_cast<size_t>(*(data++));
-              hash *= FNV1A_PRIME;
-            }
-            return hash;
-          }
-
-          constexpr size_t fnv1aHash(const char *data, size_t n) {
-            size_t hash = FNV1A_BASE;
-            for (size_t i = 0; i < n; ++i) {
-              hash ^= static_cast<size_t>(data[i]);
-              hash *= FNV1A_PRIME;
-            }
-            return hash;
-          }
-
-          size_t fnv1aHash(std::string_view _str) { return fnv1aHash(_str.data(), _str.size()); }
-
-          constexpr size_t operator"" _h(char const *data, size_t n) { return fnv1aHash(data, n); }
-        }
-
-        ''')
+  # The type of names in tables and the std::string_view of an entry
+  def nameType(self) -> str:
+    return f'{self.detail}::PoolRef' if self.cfg.stringPool else 'std::string_view'
 
-    fName = self.cfg.funcName
+  def poolName(self, entry: str) -> str:
+    return f'{self.detail}::poolName({entry})' if self.cfg.stringPool else entry
 
-    # Generate switch case
-    for i in self.enums:
-      raw_str += textwrap.dedent(f'''
-
-        /*!
-         * \\brief Converts the enum {i['id']} to a std::string
-         * \\param _var The enum value to convert
-         * \\returns _var converted to a std::string
-         */
-        std::string {self.name}::{fName}( {i['id']} _var ) noexcept {{
-        {self.indent(1)}switch( _var ) {{
-        ''')
-
-      scope = i['scope']
-      if i['isScoped']:
-        scope += '::' + i['name']
-
-      for j in i['entries'].keys():
-        if j in i['blackList']:
-          continue
-
-        enum_id = scope + '::' + j
-        enum_id = re.sub('^::', '', enum_id)
-        pad = ' ' * (i['maxLen'] - len(j))
-        raw_str += self.indent(2) + 'case {0}:{2} return "{1}"{2} ;\n'.format(enum_id, j, pad)
-
-      raw_str += self.indent(2) + f'default: return "{self.cfg.defaultValue}";\n'
-      raw_str += self.indent(1) + '}\n}'
-
-    if self.cfg.enableFromStr:
-      for i in self.enums:
-        raw_str += textwrap.dedent(f'''
-
-          /*!
-          * \\brief Converts the std::string_view to an {i['id']} enum
-          * \\param _var The string to convert
-          * \\returns _var converted to {i['id']} or static_cast<{i["id"]}>(-1) if there was no match
-          */
-          {i['id']} {self.name}::{i['fname']}_fromStr( std::string_view _var ) noexcept {{
-          {self.indent(1)}switch( fnv1aHash(_var) ) {{
-          ''')
-
-        scope = i['scope']
-        if i['isScoped']:
-          scope += '::' + i['name']
-
-        for j in i['entries'].keys():
-          enum_id = scope + '::' + j
-          enum_id = re.sub('^::', '', enum_id)
-          pad = ' ' * (i['maxLen'] - len(j))
-          raw_str += self.indent(2) + f'case "{j}"_h:{pad} return {enum_id}{pad} ;\n'.format(enum_id, j, pad)
-
-        raw_str += self.indent(2) + f'default: return static_cast<{i["id"]}>(-1);\n'
-        raw_str += self.indent(1) + '}\n}'
-
-    # Generate common function
-    if self.cfg.enableBitfields:
-      raw_str += textwrap.dedent(f'''
-
-        /*!
-        * \\brief Converts the list of strings to one string concatinated with '{self.cfg.bitfieldConcat}'
-        * \\param _list The list of strings to convert
-        * \\returns The converted _list
-        */
-        std::string {self.name}::stringListToString(std::vector<std::string> _list) noexcept {{
-          std::string lResult;
-          for( size_t i = 0; i < _list.size(); ++i ) {{
-            if( i != 0 ) {{
-              lResult += "{self.cfg.bitfieldConcat}";
-            }}
-
-            lResult += _list[i];
-          }}
-          return lResult;
-        }}
+  def nameNotEmpty(self, entry: str) -> str:
+    return f'{entry}.size != 0' if self.cfg.stringPool else f'!{entry}.empty()'
 
-        ''')
-
-      for i in self.enums:
-        raw_str += textwrap.dedent(f'''
-
-          /*!
-           * \\brief Converts the enum bitfield {i['id']} to a std::string
-           * \\param _var The bitfield value to convert
-           * \\returns The _var bitfield converted to a std::string
-           */
-          std::string {self.name}::{i['fname']}_{fName}( {self.cfg.bitfieldType} _var ) noexcept {{
-          {self.indent(1)}return stringListToString( {i['fname']}_{fName}_Raw( _var ) );
-          }}
-          ''')
-
-      for i in self.enums:
-        raw_str += textwrap.dedent(f'''
-
-          /*!
-           * \\brief Converts the enum bitfield {i['id']} to std::vector of std::string
-           * \\param _var The bitfield value to convert
-           * \\returns _var converted to a std::vector of std::string
-           */
-          std::vector<std::string> {self.name}::{i['fname']}_{fName}_Raw( {self.cfg.bitfieldType} _var ) noexcept {{
-          {self.indent(1)}std::vector<std::string> list;
-          ''')
-
-        scope = i['scope']
-        if i['isScoped']:
-          scope += '::' + i['name']
-
-        for j in i['entries'].keys():
-          id = scope + '::' + j
-          id = re.sub('^::', '', id)
-          pad = ' ' * (i['maxLen'] - len(j))
-          raw_str += self.indent(1)
-          raw_str += 'if ( CHECK_BIT( _var, {0}{2} ) ) {{ list.emplace_back( "{1}"{2} ); }}\n'.format(id, j, pad)
-
-        raw_str += '\n{}return list;\n}}'.format(self.indent(1))
+  def toStrDef(self, i: EnumIds) -> str:
+    i1 = self.indent(1)
+    i2 = self.indent(2)
+    if self.cfg.useStringView and i.info.dense is not None:
+      return self.toStrTables(i)
 
-    # List of enum values
-    if self.cfg.enableGetList:
-      raw_str += '\n\n\n'
+    if self.cfg.useStringView:
+      out = [_toStrViewFunc.format(id=i.id, spec=self.spec(True), **self.names) + f'{i1}switch( _var ) {{\n']
+    else:
+      out = [_toStrFunc.format(id=i.id, spec=self.spec(False), **self.names)]
+
+    for j in i.info.unique():
+      pad = ' ' * (i.info.maxLen - len(j))
+      if not self.cfg.stringPool:
+        out += [f'{i2}case {i.prefix}{j}:{pad} return "{j}"{pad} ;\n']
+      elif self.cfg.useStringView:
+        out += [f'{i2}case {i.prefix}{j}:{pad} return {self.nameView(j)};\n']
+      else:
+        out += [f'{i2}case {i.prefix}{j}:{pad} return std::string({self.nameView(j)});\n']
+
+    out += [f'{i2}default: return "{self.cfg.defaultValue}";\n{i1}}}\n}}']
+    return ''.join(out)
+
+  def fromStrDef(self, i: EnumIds) -> str:
+    i1 = self.indent(1)
+    i2 = self.indent(2)
+    if not i.features.fromStr:
+      return ''
+    if self.cfg.perfectHash:
+      return self.fromStrPH(i)
 
-      for i in self.enums:
-        raw_str += textwrap.dedent(f'''
+    out = [_fromStrFunc.format(id=i.id, fname=i.fname, spec=self.spec(True), **self.names)]
+    for j in i.info.names:
+      pad = ' ' * (i.info.maxLen - len(j))
+      label = f'{self.d}fnv1aHash("{j}")' if self.cfg.headerOnly else f'"{j}"_h'
+      out += [f'{i2}case {label}:{pad} return {i.prefix}{j}{pad} ;\n']
 
-          /*!
-           * \\brief Retrieves all unique values of {i['id']}
-           * \\returns a std::vector<{i['id']}> of all unique values
-           */
-          std::vector<{i['id']}> {self.name}::getAll_{i['fname']}() noexcept {{
-          {self.indent(1)}return {{
-          ''')
+    out += [f'{i2}default: return static_cast<{i.id}>(-1);\n{i1}}}\n}}']
+    return ''.join(out)
 
-        scope = i['scope']
-        if i['isScoped']:
-          scope += '::' + i['name']
+  def bitfieldDef(self, i: EnumIds) -> str:
+    if not i.features.bitfields:
+      return ''
+    bitFuncs = _bitFuncs.format(id=i.id, fname=i.fname, i2=self.indent(2), concat=self.cfg.bitfieldConcat, spec=self.spec(False), **self.names)
+    return self.forEachName(i) + bitFuncs
 
-        for j in i['entries'].keys():
-          if j in i['blackList']:
-            continue
+  def getAllDef(self, i: EnumIds) -> str:
+    i1 = self.indent(1)
+    i2 = self.indent(2)
+    if not i.features.getList or self.cfg.constexprLists:
+      return ''
 
-          enum_id = scope + '::' + j
-          enum_id = re.sub('^::', '', enum_id)
-          raw_str += f'{self.indent(2)}{enum_id},\n'
-        raw_str += f'{self.indent(1)}}};\n}}'
+    out = [_getAllFunc.format(id=i.id, fname=i.fname, spec=self.spec(False), **self.names)]
+    out += [f'{i2}{i.prefix}{j},\n' for j in i.info.unique()]
+    out += [f'{i1}}};\n}}']
+    return ''.join(out)
 
-    return raw_str + '\n\n// clang-format on\n\n'
+  # Reports the enums without bitfield functions because they are sequential
+  # and the size of the definitions that were skipped
+  def logBitfields(self) -> None:
+    skipped: T.List[EnumIds] = []
+    for i in self.enums:
+      features = self.selection.lookup(i.info.qualifiedName)  # without the detection
+      if features is not None and features.bitfields and not i.features.bitfields:
+        skipped += [i]
+
+    kinds   = ', '.join(f'{sum(1 for i in self.enums if i.info.kind == x)} {x.name.lower()}' for x in BitfieldKind)
+    saved   = sum(len(self.bitfieldDef(i._replace(features=i.features._replace(bitfields=True)))) for i in skipped)
+    logging.info(f'Skipped the bitfield functions of {len(skipped)} of {len(self.enums)} enums ({kinds}), {saved / 1024:.1f} KiB less definitions')
+
+  # The enumDefinitions of all enums in the order of self.enums. Only the
+  # enums that are not in the cache are rendered and then added to it
+  def render(self) -> T.List[T.List[str]]:
+    if self.cache is None:
+      return self.renderEnums(list(range(len(self.enums))))
+
+    keys = [self.cacheKey(x) for x in self.enums]
+    res  = [self.cache.load(x) for x in keys]
+    todo = [x for x, r in enumerate(res) if r is None]
+    for x, r in zip(todo, self.renderEnums(todo)):
+      self.cache.store(keys[x], r)
+      res[x] = r
+
+    self.cache.evict()
+    self.cache.logStats()
+    return T.cast(T.List[T.List[str]], res)
+
+  # The enums are independent of each other, so they are split into chunks
+  # for the worker processes and the results are merged in order,
+  # independent of the scheduling. The output is the same as rendering them
+  # one by one
+  def renderEnums(self, indices: T.List[int]) -> T.List[T.List[str]]:
+    if self.numJobs <= 1 or len(indices) < 2:
+      return [self.enumDefinitions(self.enums[x]) for x in indices]
+
+    level = logging.getLogger().level
+    chunk = max(1, len(indices) // (self.numJobs * 8))  # a few chunks per worker for the load balance
+    with concurrent.futures.ProcessPoolExecutor(self.numJobs, initializer=initWorker, initargs=(self, level)) as ex:
+      return list(ex.map(renderJob, indices, chunksize=chunk))
+
+  # Everything the code of an enum depends on: the class, the config (without
+  # the selection, see features), the enum and its offsets in the string pool
+  def cacheKey(self, i: EnumIds) -> str:
+    assert self.cache is not None
+    cfg     = {k: v for k, v in self.cfg.cfg.items() if k not in ('include', 'exclude', 'features')}
+    offsets = [self.pool.get(x, -1) for x in i.info.names] if self.cfg.stringPool else []
+    return self.cache.key(self.name, json.dumps(cfg), json.dumps([i.id, i.fname, i.prefix, list(i.features)]), json.dumps(i.info.toJSON()),
+                          json.dumps(offsets))
+
+  # The shard files and the indices of their enums (in self.enums). With
+  # numShards the enums are distributed by the size of their definitions
+  # (largest first, into the smallest shard) and the shards are numbered.
+  # Otherwise there is one shard per enum list, named after its source
+  def assignShards(self, sizes: T.Sequence[int]) -> T.List[T.Tuple[Path, T.List[int]]]:
+    def shardFile(suffix: str) -> Path:
+      return self.cppFile.with_name(f'{self.cppFile.stem}_{suffix}{self.cppFile.suffix}')
+
+    if self.numShards > 0:
+      load = [0] * self.numShards
+      members: T.List[T.List[int]] = [[] for _ in range(self.numShards)]
+      for x in sorted(range(len(sizes)), key=lambda x: (-sizes[x], x)):
+        k = min(range(self.numShards), key=lambda k: (load[k], k))
+        load[k] += sizes[x]
+        members[k] += [x]
+
+      return [(shardFile(str(k)), sorted(x)) for k, x in enumerate(members)]
+
+    res: T.List[T.Tuple[Path, T.List[int]]] = []
+    used: T.Set[str] = set()
+    pos = 0
+    for source, count in self.sources:
+      stem = name = Path(source).stem
+      n = 1
+      while name in used:
+        n += 1
+        name = f'{stem}_{n}'
+
+      used.add(name)
+      res += [(shardFile(name), list(range(pos, pos + count)))]
+      pos += count
+
+    return res
+
+  # The lookup tables of a function as (type, name, rows). They are static
+  # variables of the function in the .cpp file. A constexpr function can not
+  # have static variables, so in the header only mode they are defined before
+  # the function in the detail namespace instead, prefixed with the enum.
+  # Returns the code before and after the head of the function
+  def tables(self, i: EnumIds, tables: T.List[T.Tuple[str, str, T.List[str]]]) -> T.Tuple[str, str]:
+    i1 = self.indent(1)
+    i2 = self.indent(2)
+    if not tables:
+      return '', ''
+
+    if self.cfg.headerOnly:
+      out = [f'\n\nnamespace {self.detail} {{\n']
+      for type, name, rows in tables:
+        out += [f'{i1}inline constexpr {type} {i.fname}_{name}[] = {{\n']
+        out += [f'{i2}{x},\n' for x in rows]
+        out += [f'{i1}}};\n']
+      return ''.join(out + [f'}} // namespace {self.detail}']), ''
+
+    out = []
+    for type, name, rows in tables:
+      out += [f'{i1}static constexpr {type} {name}[] = {{\n']
+      out += [f'{i2}{x},\n' for x in rows]
+      out += [f'{i1}}};\n']
+    return '', ''.join(out)
+
+  # The name of a table of tables() in the function
+  def ref(self, i: EnumIds, name: str) -> str:
+    return f'{self.d}{i.fname}_{name}' if self.cfg.headerOnly else name
+
+  # The masks of the enum are split by their (known) values: a table of the
+  # single bit masks indexed by the bit and the composite masks, widest first.
+  # Masks with unknown values are checked last, after the composite masks
+  def forEachName(self, i: EnumIds) -> str:
+    i1 = self.indent(1)
+    i2 = self.indent(2)
+    i3 = self.indent(3)
+    zero  = None
+    bits: T.Dict[int, str] = {}
+    masks: T.List[T.Tuple[int, str]] = []  # (number of bits, name)
+    for j, value, dup in zip(i.info.names, i.info.values, i.info.duplicates):
+      if dup:
+        continue
+      if not isinstance(value, int):
+        masks += [(0, j)]
+      elif value == 0 and zero is None:
+        zero = j
+      elif 0 < value < 1 << 64 and value & (value - 1) == 0:
+        bits.setdefault(value.bit_length() - 1, j)
+      elif 0 < value < 1 << 64:
+        masks += [(bin(value).count('1'), j)]
+
+    masks.sort(key=lambda x: -x[0])  # stable: keeps the order of the enum
+    numBits = max(bits, default=-1) + 1
+
+    # a template function is inline anyway
+    out = [_forEachNameFunc.format(fname=i.fname, spec='' if self.cfg.headerOnly else 'static ')]
+    if masks:
+      out += [f'{i1}static constexpr uint64_t masks[] = {{\n']
+      out += [f'{i2}static_cast<uint64_t>({i.prefix}{j}),\n' for _, j in masks]
+      out += [f'{i1}}};\n{i1}static constexpr {self.nameType()} maskNames[] = {{\n']
+      out += [f'{i2}{self.nameRef(j)},\n' for _, j in masks]
+      out += [f'{i1}}};\n']
+
+    if bits:
+      out += [f'{i1}static constexpr {self.nameType()} bitNames[] = {{\n']
+      out += [f'{i2}{self.nameRef(bits.get(x, ""))},\n' for x in range(numBits)]
+      out += [f'{i1}}};\n']
+
+    out += ['\n']
+    if zero is not None:
+      out += [f'{i1}if( _var == 0 ) {{\n{i2}_f({self.nameView(zero)});\n{i2}return;\n{i1}}}\n']
+
+    if masks:
+      out += [f'{i1}for( size_t i = 0; i < {len(masks)}; ++i ) {{\n']
+      out += [f'{i2}if( masks[i] != 0 && (_var & masks[i]) == masks[i] ) {{\n']
+      out += [f'{i3}_f({self.poolName("maskNames[i]")});\n{i3}_var &= ~masks[i];\n{i2}}}\n{i1}}}\n']
+
+    if bits:
+      out += [f'{i1}for( ; _var != 0; _var &= _var - 1 ) {{\n']
+      out += [f'{i2}int bit = countTrailingZeros(_var);\n']
+      out += [f'{i2}if( bit < {numBits} && {self.nameNotEmpty("bitNames[bit]")} ) {{\n{i3}_f({self.poolName("bitNames[bit]")});\n{i2}}}\n{i1}}}\n']
+
+    if not (bits or masks or zero is not None):
+      out += [f'{i1}(void)_var;\n{i1}(void)_f;\n']
+
+    out += ['}']
+    if self.cfg.headerOnly:
+      return f'\n\nnamespace {self.detail} {{' + ''.join(out) + f'\n}} // namespace {self.detail}'
+    return ''.join(out)
+
+  # Looks up the values in the dense range of the enum in a direct-index array
+  # and all other values by a binary search in a sorted array
+  def toStrTables(self, i: EnumIds) -> str:
+    i1 = self.indent(1)
+    i2 = self.indent(2)
+    assert i.info.dense is not None
+    lo, hi = i.info.dense
+
+    byValue: T.Dict[int, str] = {}  # value --> first unique name
+    for j, value, dup in zip(i.info.names, i.info.values, i.info.duplicates):
+      if not dup:
+        byValue.setdefault(T.cast(int, value), j)
+
+    dense  = [byValue.get(x, '') for x in range(lo, hi + 1)]
+    sparse = sorted(x for x in byValue if not lo <= x <= hi)
+
+    tables = []
+    if dense:
+      tables += [(self.nameType(), 'dense', [self.nameRef(j) for j in dense])]
+    if sparse:
+      tables += [(i.id, 'sparseValues', [f'{i.prefix}{byValue[x]}' for x in sparse])]
+      tables += [(self.nameType(), 'sparseNames', [self.nameRef(byValue[x]) for x in sparse])]
+
+    before, inside = self.tables(i, tables)
+    out = [before, _toStrViewFunc.format(id=i.id, spec=self.spec(True), **self.names), inside]
+
+    if dense:
+      offset = f' - {lo}u' if lo > 0 else f' + {-lo}u' if lo < 0 else ''
+      entry = self.ref(i, 'dense') + '[index]'
+      out += [_denseLookup.format(offset=offset, size=len(dense), check=self.nameNotEmpty(entry), result=self.poolName(entry), i1=i1, i2=i2)]
+
+    if sparse:
+      entry = self.ref(i, 'sparseNames') + '[first]'
+      out += [_sparseLookup.format(size=len(sparse), values=self.ref(i, 'sparseValues'), result=self.poolName(entry), i1=i1, i2=i2)]
+
+    if not dense and not sparse:
+      out += [f'{i1}(void)_var;\n']
+
+    out += [f'\n{i1}return "{self.cfg.defaultValue}";\n}}']
+    return ''.join(out)
+
+  # A lookup in a minimal perfect hash table of the names followed by a single
+  # string compare
+  def fromStrPH(self, i: EnumIds) -> str:
+    i1   = self.indent(1)
+    i2   = self.indent(2)
+    head = _fromStrPHFunc.format(id=i.id, fname=i.fname, spec=self.spec(True), **self.names)
+    if not i.info.names:
+      return head + f'{i1}(void)_var;\n{i1}return static_cast<{i.id}>(-1);\n}}'
+
+    ph    = perfecthash.build(i.info.names)
+    dtype = uintType(max(ph.displacements))
+
+    rows = [', '.join(str(x) for x in ph.displacements[k:k + 16]) for k in range(0, len(ph.displacements), 16)]
+    entries = []
+    for k in ph.slots:
+      j = i.info.names[k]
+      pad = ' ' * (i.info.maxLen - len(j))
+      if self.cfg.stringPool:
+        entries += [f'{{ {self.nameRef(j)}, {i.prefix}{j} }}']
+      else:
+        entries += [f'{{ "{j}",{pad} {i.prefix}{j}{pad} }}']
+
+    before, inside = self.tables(i, [(dtype, 'displacements', rows), (f'PHEntry<{i.id}>', 'table', entries)])
+    table = self.ref(i, 'table')
+    if self.cfg.headerOnly or self.cfg.stringPool:
+      match = f'{self.poolName(table + "[slot].name")} == _var'
+    else:
+      match = f'{table}[slot].name.size() == _var.size() && std::memcmp({table}[slot].name.data(), _var.data(), _var.size()) == 0'
 
+    lookup = _fromStrPHLookup.format(id=i.id, i2=i2, seed=ph.seed, numBuckets=len(ph.displacements), numSlots=len(ph.slots),
+                                     displacements=self.ref(i, 'displacements'), table=table, match=match, **self.names)
+    return before + head + inside + lookup
 
   def write(self) -> None:
-    logging.info(f'Generating class {self.name} with {len(self.enums)} enums')
+    logging.info(f'Generating class {self.name} with {len(self.enums_raw)} enums ({self.selection.numSkipped()} not selected)')
 
     ### set helper values
-    self.maxIdLen = 0
-
-    def calcID(indata: 'EnumDict') -> 'PocEnumDict':
-      x: 'PocEnumDict' = T.cast('PocEnumDict', indata.copy())
-      x['maxLen'] = 0
-      x['scope'] = re.sub(r'^{}(::)?'.format(self.cfg.namespace), '', x['scope'])
-      x['id'] = x['scope'] + '::' + x['name']
-      x['id'] = re.sub('^::', '', x['id'])
-      x['fname'] = re.sub('::', '_', x['id'])
-      self.maxIdLen = max(len(x['id']), self.maxIdLen)
-
-      for i in x['entries'].keys():
-        x['maxLen'] = max(len(i), x['maxLen'])
-
-      return x
-
-    self.enums   = [calcID(x) for x in self.enums_raw]
-
-    self.hppFile.write_text(self.genHpp())
-    self.cppFile.write_text(self.genCpp())
+    nsRegex = re.compile(r'^{}(::)?'.format(self.cfg.namespace))
+
+    def calcID(x: 'EnumInfo') -> EnumIds:
+      scope = nsRegex.sub('', x.scope)
+      id    = re.sub('^::', '', scope + '::' + x.name)
+      entryScope = scope + '::' + x.name if x.isScoped else scope
+      features   = self.selection.lookup(x.qualifiedName, x.kind)
+      assert features is not None
+      return EnumIds(x, id, id.replace('::', '_'), re.sub('^::', '', entryScope + '::'), features)
+
+    self.enums    = [calcID(x) for x in self.enums_raw]
+    self.enabled  = Features(*(any(x) for x in zip(self.selection.default, *(x.features for x in self.enums))))
+    self.maxIdLen = max((len(x.id) for x in self.enums), default=0)
+
+    if self.cfg.stringPool:
+      self.pool = self.buildPool()
+    if self.cfg.detectBitfields and logging.getLogger().isEnabledFor(logging.INFO):
+      self.logBitfields()
+
+    # Rendered up front to distribute the enums by their size and in parallel
+    rendered = None
+    if self.numJobs > 1 or self.cache is not None or (self.numShards > 0 and not self.cfg.headerOnly):
+      rendered = self.render()
+
+    with updateFile(self.hppFile) as fp:
+      self.genHpp(fp, rendered)
+
+    if self.numShards <= 0 and not self.shardPerInput:
+      with updateFile(self.cppFile) as fp:
+        self.genCpp(fp, self.cppFile, self.enums, True, rendered)
+
+      logging.info('Wrote source files')
+      return
+
+    sizes    = [sum(len(y) for y in x) for x in rendered] if rendered is not None else [0] * len(self.enums)
+    shards   = self.assignShards(sizes)
+    self.shardFiles = [x for x, _ in shards]
+
+    with updateFile(self.cppFile) as fp:
+      self.genCpp(fp, self.cppFile, [])
+
+    for file, members in shards:
+      logging.info(f'Writing {len(members)} enums to {file.name}')
+      with updateFile(file) as fp:
+        self.genCpp(fp, file, [self.enums[x] for x in members], False, [rendered[x] for x in members] if rendered is not None else None)
 
     logging.info('Wrote source files')
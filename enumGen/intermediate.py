@@ -0,0 +1,196 @@
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+import typing as T
+from .enums import EnumInfo
+
+if T.TYPE_CHECKING:
+  from .regions import Region
+
+# The compact intermediate format (parse --format compact)
+#
+#   magic (8 bytes), format version (uint32), size of the header (uint32)
+#   header: compact JSON {"file", "index", ["includes"], ["regions"]}
+#   records: one compact JSON array per enum (see encode)
+#
+# All integers are little endian. The index has the qualified name, the offset
+# (relative to the first record) and the size of every record, so a reader can
+# map the file and only decode the enums it needs.
+#
+# A database (see link.py) has {"members", "index"} as its header. Every entry
+# of its index also has the position of the member it belongs to and the
+# records are grouped by member.
+
+magic   = b'ENUMGEN\0'
+version = 1
+
+_prefix = struct.Struct('<8sII')
+
+# An enum list in a database
+class Member(T.NamedTuple):
+  file:     str          # the parsed header
+  source:   str          # the enum list
+  stamp:    T.List[int]  # mtime_ns and size of source when it was linked
+  includes: T.List[str]  # the enum lists source includes (-F)
+  names:    T.List[str]  # the qualified names of all enums of source (with the duplicates)
+
+def encode(i: EnumInfo) -> bytes:
+  dups = [x for x, dup in enumerate(i.duplicates) if dup]
+  return json.dumps([i.scope, i.isScoped, i.name, i.names, i.values, dups], separators=(',', ':')).encode()
+
+# Raises KeyError, TypeError or ValueError if data is not a valid record
+def decode(data: bytes) -> EnumInfo:
+  scope, isScoped, name, names, values, dups = json.loads(data)
+  if not isinstance(names, list) or not isinstance(values, list) or len(names) != len(values):
+    raise TypeError('invalid enum record')
+
+  duplicates = bytearray(len(names))
+  for x in dups:
+    if not isinstance(x, int) or not 0 <= x < len(names):
+      raise ValueError(f'invalid duplicate index {x!r}')
+    duplicates[x] = 1
+  return EnumInfo(str(scope), bool(isScoped), str(name), names, values, duplicates)
+
+def isCompact(path: Path) -> bool:
+  try:
+    with path.open('rb') as fp:
+      return fp.read(len(magic)) == magic
+  except OSError:
+    return False
+
+# Same as compile.writeEnumsJSON. The records are buffered in a temporary file
+# until the index is complete, so the enums are still written one at a time
+def writeCompact(fp: T.BinaryIO, file: str, enumIter: T.Iterable[EnumInfo], includes: T.Optional[T.Callable[[], T.List[str]]] = None,
+                 regionList: T.Optional[T.List['Region']] = None) -> None:
+  index: T.List[T.Tuple[str, int, int]] = []
+  with tempfile.TemporaryFile() as body:
+    offset = 0
+    for i in enumIter:
+      data = encode(i)
+      body.write(data)
+      index += [(i.qualifiedName, offset, len(data))]
+      offset += len(data)
+
+    header: T.Dict[str, T.Any] = {'file': file, 'index': index}
+    if regionList is not None:
+      header['regions'] = [x.toJSON() for x in regionList]
+    if includes is not None:
+      header['includes'] = includes()
+
+    writeHeader(fp, header)
+    body.seek(0)
+    shutil.copyfileobj(body, fp)
+
+# records are (qualified name, member, encoded enum) and must be sorted by member
+def writeDatabase(fp: T.BinaryIO, members: T.List[Member], records: T.List[T.Tuple[str, int, bytes]]) -> None:
+  index: T.List[T.Tuple[str, int, int, int]] = []
+  offset = 0
+  for name, member, data in records:
+    index += [(name, offset, len(data), member)]
+    offset += len(data)
+
+  writeHeader(fp, {'members': [list(x) for x in members], 'index': index})
+  for _, _, data in records:
+    fp.write(data)
+
+def writeHeader(fp: T.BinaryIO, header: T.Dict[str, T.Any]) -> None:
+  raw = json.dumps(header, separators=(',', ':')).encode()
+  fp.write(_prefix.pack(magic, version, len(raw)) + raw)
+
+# Reads a compact intermediate or a database through mmap. Only the header is
+# decoded when it is opened, the enums are decoded on access
+class CompactReader:
+  def __init__(self, path: Path) -> None:
+    self.path = path
+    with path.open('rb') as fp:
+      self.data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+      if len(self.data) < _prefix.size:
+        raise ValueError(f'{path} is not a compact intermediate')
+      tag, fmt, size = _prefix.unpack_from(self.data)
+      if tag != magic:
+        raise ValueError(f'{path} is not a compact intermediate')
+      if fmt != version:
+        raise ValueError(f'{path} has the unsupported format version {fmt} (expected {version})')
+
+      header = json.loads(self.data[_prefix.size:_prefix.size + size])
+      self.base       = _prefix.size + size
+      self.isDatabase = 'members' in header
+      self.followed   = 'includes' in header  # written with --follow-includes
+      self.includes: T.List[str]               = [str(x) for x in header.get('includes', [])]
+      self.regions:  T.Optional[T.List[T.Any]] = header.get('regions')
+      self.file:     str                       = '' if self.isDatabase else str(header['file'])
+      self.members:  T.List[Member]
+
+      # (qualified name, offset, size, member)
+      self.index: T.List[T.Tuple[str, int, int, int]]
+      if self.isDatabase:
+        self.members = [Member(str(f), str(s), [int(x) for x in st], [str(x) for x in inc], [str(x) for x in n])
+                        for f, s, st, inc, n in header['members']]
+        self.index   = [(str(n), int(o), int(s), int(m)) for n, o, s, m in header['index']]
+        if any(not 0 <= x[3] < len(self.members) for x in self.index):
+          raise ValueError(f'{path} has an invalid index')
+      else:
+        self.index   = [(str(n), int(o), int(s), 0) for n, o, s in header['index']]
+        self.members = [Member(self.file, path.as_posix(), [], self.includes, [x[0] for x in self.index])]
+    except BaseException:
+      self.data.close()
+      raise
+
+  def __enter__(self) -> 'CompactReader':
+    return self
+
+  def __exit__(self, *args: T.Any) -> None:
+    self.close()
+
+  def close(self) -> None:
+    self.data.close()
+
+  # The qualified names of all enums without decoding them
+  def names(self) -> T.List[str]:
+    return [x[0] for x in self.index]
+
+  # The encoded record of the k-th enum
+  def raw(self, k: int) -> bytes:
+    _, offset, size, _ = self.index[k]
+    return self.data[self.base + offset:self.base + offset + size]
+
+  def load(self, k: int) -> EnumInfo:
+    try:
+      return decode(self.raw(k))
+    except (KeyError, TypeError, ValueError) as err:
+      raise ValueError(f'{self.path} has an invalid record of {self.index[k][0]}: {err}')
+
+  def enums(self) -> T.List[EnumInfo]:
+    return [self.load(x) for x in range(len(self.index))]
+
+  # The enums of every member. With select, only the enums whose qualified
+  # name is selected are decoded
+  def groups(self, select: T.Optional[T.Callable[[str], bool]] = None) -> T.List[T.Tuple[Member, T.List[EnumInfo]]]:
+    res: T.List[T.List[EnumInfo]] = [[] for _ in self.members]
+    for k, x in enumerate(self.index):
+      if select is None or select(x[0]):
+        res[x[3]] += [self.load(k)]
+    return list(zip(self.members, res))
+
+  # The same dict as json.loads of the JSON intermediate
+  def toJSON(self) -> T.Dict[str, T.Any]:
+    if self.isDatabase:
+      raise ValueError(f'{self.path} is a database')
+    res: T.Dict[str, T.Any] = {'file': self.file, 'enums': [x.toJSON() for x in self.enums()]}
+    if self.regions is not None:
+      res['regions'] = self.regions
+    if self.followed:
+      res['includes'] = self.includes
+    return res
+
+# Reads an intermediate in either format as the dict of the JSON format
+def loadJSON(path: Path) -> T.Any:
+  if isCompact(path):
+    with CompactReader(path) as r:
+      return r.toJSON()
+  return json.loads(path.read_text())
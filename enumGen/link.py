@@ -0,0 +1,100 @@
+import json
+import logging
+from pathlib import Path
+import typing as T
+from . import intermediate
+from .enums import EnumInfo
+from .intermediate import Member
+from .output import updateBinaryFile
+
+# Links enum lists (JSON or compact) into one database that is indexed by the
+# qualified names of the enums (see intermediate.py), like a static archive.
+# An enum declared by several lists is only kept once, but the same name with
+# a different definition is a conflict. Members whose enum list did not change
+# since the previous database are copied from it without reading them again
+class Linker:
+  def __init__(self, out: Path) -> None:
+    self.out        = out
+    self.members:   T.List[Member]                    = []
+    self.records:   T.List[T.Tuple[str, int, bytes]]  = []
+    self.byName:    T.Dict[str, T.Tuple[int, bytes]]  = {}
+    self.loaded:    T.Set[Path]                       = set()
+    self.conflicts: T.List[str]                       = []
+    self.duplicates = 0
+    self.reused     = 0
+
+    # The members and the records of the previous database
+    self.oldMembers: T.Dict[str, Member] = {}
+    self.oldRecords: T.Dict[str, bytes]  = {}
+
+  def loadPrevious(self) -> None:
+    if not intermediate.isCompact(self.out):
+      return
+
+    try:
+      with intermediate.CompactReader(self.out) as r:
+        if not r.isDatabase:
+          return
+        self.oldMembers = {x.source: x for x in r.members}
+        self.oldRecords = {x[0]: r.raw(k) for k, x in enumerate(r.index)}
+    except (OSError, ValueError, KeyError, TypeError):
+      logging.warning(f'Ignoring the invalid previous database {self.out.name}')
+
+  # Adds the enum list fp and (first) the lists it includes
+  def add(self, fp: Path) -> None:
+    fp = fp.resolve()
+    if fp in self.loaded:
+      return
+
+    self.loaded.add(fp)
+    st    = fp.stat()
+    stamp = [st.st_mtime_ns, st.st_size]
+    # Every name of the database is linked once, also the duplicates of prev
+    prev  = self.oldMembers.get(fp.as_posix())
+    if prev and prev.stamp == stamp and all(x in self.oldRecords for x in prev.names):
+      self.reused += 1
+      for inc in prev.includes:
+        self.add(Path(inc))
+      self.addMember(prev, [(x, self.oldRecords[x]) for x in prev.names])
+      return
+
+    if intermediate.isCompact(fp):
+      with intermediate.CompactReader(fp) as r:
+        if r.isDatabase:
+          raise ValueError(f'{fp} is already a database')
+        for inc in r.includes:
+          self.add(Path(inc))
+        self.addMember(Member(r.file, fp.as_posix(), stamp, r.includes, r.names()), [(x[0], r.raw(k)) for k, x in enumerate(r.index)])
+      return
+
+    data = json.loads(fp.read_text())
+    if not isinstance(data, dict) or not isinstance(data.get('file'), str) or not isinstance(data.get('enums'), list):
+      raise ValueError(f'{fp} is not an enum list')
+
+    includes = [str(x) for x in data.get('includes', [])]
+    for inc in includes:
+      self.add(Path(inc))
+    enums = [EnumInfo.fromJSON(x) for x in data['enums']]
+    self.addMember(Member(data['file'], fp.as_posix(), stamp, includes, [x.qualifiedName for x in enums]),
+                   [(x.qualifiedName, intermediate.encode(x)) for x in enums])
+
+  def addMember(self, member: Member, records: T.List[T.Tuple[str, bytes]]) -> None:
+    idx = len(self.members)
+    self.members.append(member)
+    for name, data in records:
+      prev = self.byName.get(name)
+      if prev is None:
+        self.byName[name] = (idx, data)
+        self.records.append((name, idx, data))
+      elif prev[1] == data:
+        self.duplicates += 1
+        logging.info(f'{name} of {member.source} is already linked from {self.members[prev[0]].source}')
+      else:
+        self.conflicts.append(f'{name} of {member.source} conflicts with {self.members[prev[0]].source}')
+
+  def write(self) -> None:
+    with updateBinaryFile(self.out) as fp:
+      intermediate.writeDatabase(fp, self.members, self.records)
+
+    logging.info(f'Linked {len(self.records)} enums of {len(self.members)} enum lists into {self.out.name} '
+                 f'({self.reused} unchanged, {self.duplicates} duplicates)')
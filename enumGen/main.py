@@ -6,35 +6,107 @@ import os
 import pathlib
 import logging
 import json
+import shlex
+import time
+import typing as T
 from pathlib import Path
-from . import config, parser, enums, generate
+from . import config, generate, intermediate, client, server
+from .cache import ParseCache, FragmentCache
+from .enums import EnumInfo
+from .output import writeDepfile
+from .link import Linker
+from .compile import CompileOptions, compileHeader, compileBatch, availableCores
+
+VERSION = '1.0.0'
+
+try:
+  import resource
+except ImportError:
+  resource = None  # type: ignore
+
+# The peak resident set size of this process
+def peakRSS() -> str:
+  if resource is None:
+    return 'unknown'
+
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  rss = rss if sys.platform == 'darwin' else rss * 1024  # bytes on macOS, KiB otherwise
+  return f'{rss / (1 << 20):.1f} MiB'
 
 
 class EnumGenerator:
   cfg = config.Config()
 
-  def __init__(self) -> None:
+  # argv defaults to sys.argv[1:]
+  def __init__(self, argv: T.Optional[T.List[str]] = None) -> None:
     argParser = argparse.ArgumentParser(description='Enum to String generator for C++')
 
     argParser.add_argument('-c', '--config', help='read config from CFG', metavar='CFG', type=Path)
-    argParser.add_argument('-v', '--version', action='version', version='1.0.0')
+    argParser.add_argument('-v', '--version', action='version', version=VERSION)
     argParser.add_argument('-V', '--verbose', action='store_true', help='verbose output')
 
     argParser.add_argument('-C', dest='printCfg', action='store_true', help='print config and exit')
     argParser.add_argument('-W', dest='writeCfg', help='write config to OUT', metavar='OUT', type=Path)
 
     subparsers = argParser.add_subparsers(title='commands')
-    compileGroup = subparsers.add_parser('parse', help='compile c/c++ headers to enum lists')
+    parseOpts = argparse.ArgumentParser(add_help=False)
+    parseOpts.add_argument('-s', '--stream', action='store_true', help='parse the input in chunks with bounded memory usage')
+    parseOpts.add_argument('--chunk-size', dest='chunkSize', type=int, default=1 << 20, metavar='N',
+                           help='read N characters at once in the streaming mode (default: %(default)s)')
+    parseOpts.add_argument('--cache', help='cache the parse results in DIR', metavar='DIR', type=Path)
+    parseOpts.add_argument('--cache-size', dest='cacheSize', type=int, default=256, metavar='MiB',
+                           help='maximum size of the parse cache (default: %(default)s)')
+    parseOpts.add_argument('--depfile', type=Path, metavar='DEP', help='write a Makefile style depfile to DEP')
+    parseOpts.add_argument('-i', '--incremental', action='store_true',
+                           help='record regions in the output and only parse the regions that changed since the last run '
+                                '(--stream and --cache are ignored)')
+    parseOpts.add_argument('-F', '--follow-includes', dest='followIncludes', action='store_true',
+                           help='also parse all included headers that can be found (once per run)')
+    parseOpts.add_argument('-I', dest='includeDirs', action='append', default=[], type=Path, metavar='DIR',
+                           help='add DIR to the include search path')
+    parseOpts.add_argument('--shared-dir', dest='sharedDir', type=Path, metavar='DIR',
+                           help='write the enum lists of included headers to DIR (default: next to the first output)')
+    parseOpts.add_argument('--format', choices=['json', 'compact'], default='json',
+                           help='write JSON or the compact indexed format that generate decodes lazily (default: %(default)s)')
+
+    compileGroup = subparsers.add_parser('parse', parents=[parseOpts], help='compile c/c++ headers to enum lists')
     compileGroup.add_argument('input', help='input header file', type=Path)
     compileGroup.add_argument('output', help='"compiled" output JSON file', type=Path)
 
+    batchGroup = subparsers.add_parser('batch', parents=[parseOpts], help='compile many c/c++ headers in parallel')
+    batchGroup.add_argument('files', nargs='*', metavar='IN OUT', help='pairs of input header and output JSON file', type=Path)
+    batchGroup.add_argument('-m', '--manifest', type=Path, help='read "<input> <output>" lines from MANIFEST')
+    batchGroup.add_argument('-j', '--jobs', type=int, default=0, help='number of parallel jobs (default: all available cores)')
+
+    dbGroup = subparsers.add_parser('link', help='link enum lists to a database for generate')
+    dbGroup.add_argument('database', help='the output database', type=Path)
+    dbGroup.add_argument('enumFiles', nargs='+', help='enum list files (JSON or compact)', type=Path)
+    dbGroup.add_argument('--depfile', type=Path, metavar='DEP', help='write a Makefile style depfile to DEP')
+
     linkGroup = subparsers.add_parser('generate', help='link enum lists to a c++ class')
     linkGroup.add_argument('cls', help='create the C++ class <cls>')
     linkGroup.add_argument('hpp', help='The output HPP file', type=Path)
     linkGroup.add_argument('cpp', help='The output CPP file', type=Path)
-    linkGroup.add_argument('enumFiles', nargs='+', help='JSON enum list files', type=Path)
+    linkGroup.add_argument('enumFiles', nargs='+', help='enum list files (JSON or compact)', type=Path)
+    linkGroup.add_argument('--depfile', type=Path, metavar='DEP', help='write a Makefile style depfile to DEP')
+    linkGroup.add_argument('--cache', help='cache the generated code of every enum in DIR', metavar='DIR', type=Path)
+    linkGroup.add_argument('--cache-size', dest='cacheSize', type=int, default=256, metavar='MiB',
+                           help='maximum size of the fragment cache (default: %(default)s)')
+    linkGroup.add_argument('-j', '--jobs', dest='numJobs', type=int, default=1, metavar='JOBS',
+                           help='render the enums on JOBS processes (default: %(default)s, 0: all available cores)')
+    shardGroup = linkGroup.add_mutually_exclusive_group()
+    shardGroup.add_argument('--shards', type=int, default=0, metavar='N',
+                            help='split the enum functions into N source files <cpp>_0 .. <cpp>_N-1, balanced by size')
+    shardGroup.add_argument('--shard-per-input', dest='shardPerInput', action='store_true',
+                            help='write the enum functions of every JSON file to <cpp>_<json name>')
+
+    serveGroup = subparsers.add_parser('serve', help='keep enumGen loaded for the other commands (on a unix socket)')
+    serveGroup.add_argument('--socket', metavar='PATH',
+                            help='listen on PATH (default: $ENUMGEN_SOCKET or a socket in $XDG_RUNTIME_DIR or $TMPDIR/enumGen-<uid>)')
+    serveGroup.add_argument('--idle-timeout', dest='idleTimeout', type=float, default=600, metavar='SEC',
+                            help='stop after SEC seconds without requests (default: %(default)s)')
 
-    self.args: argparse.Namespace = argParser.parse_args()
+    self.args: argparse.Namespace = argParser.parse_args(argv)
 
     fmt = '%(levelname)s: %(message)s'
     if self.args.verbose:
@@ -42,6 +114,72 @@ class EnumGenerator:
     else:
       logging.basicConfig(format=fmt, level=logging.WARNING)
 
+  def compileOptions(self) -> CompileOptions:
+    return CompileOptions(
+      chunkSize=max(self.args.chunkSize, 1) if self.args.stream else 0,
+      cacheDir=self.args.cache,
+      cacheSize=self.args.cacheSize << 20,
+      version=VERSION,
+      followIncludes=self.args.followIncludes,
+      includeDirs=tuple(x.resolve() for x in self.args.includeDirs),
+      sharedDir=self.args.sharedDir.resolve() if self.args.sharedDir else None,
+      incremental=self.args.incremental,
+      compact=self.args.format == 'compact',
+    )
+
+  # Reads the (input, output) pairs from the command line and the manifest
+  def batchJobs(self) -> T.List[T.Tuple[Path, Path]]:
+    files: T.List[Path] = list(self.args.files)
+    if self.args.manifest:
+      manifest: Path = self.args.manifest
+      for line in manifest.read_text().splitlines():
+        entry = shlex.split(line, comments=True)
+        if entry:
+          files += [manifest.parent / x for x in entry]
+
+    if len(files) % 2 != 0:
+      raise ValueError('batch expects pairs of input and output files')
+
+    jobs = [(files[x].resolve(), files[x + 1].resolve()) for x in range(0, len(files), 2)]
+    if len({x[0] for x in jobs}) != len(jobs):
+      raise ValueError('batch input files must be unique')
+    if len({x[1] for x in jobs}) != len(jobs):
+      raise ValueError('batch output files must be unique')
+
+    return jobs
+
+  def runBatch(self, jobs: T.List[T.Tuple[Path, Path]], numWorkers: int) -> int:
+    opts = self.compileOptions()
+    if opts.followIncludes:
+      sharedDir = opts.sharedDir or jobs[0][1].parent
+      sharedDir.mkdir(parents=True, exist_ok=True)
+      opts = opts._replace(sharedDir=sharedDir)
+
+    start   = time.perf_counter()
+    results = compileBatch(jobs, opts, numWorkers)
+    wall    = time.perf_counter() - start
+
+    failed = [x for x in results if x.error]
+    for i in results:
+      if i.error:
+        logging.error(f'Failed to parse {i.input}: {i.error}')
+      else:
+        logging.info(f'{i.seconds:8.3f}s  {i.input} --> {i.output.name}')
+
+    total = sum(x.seconds for x in results)
+    logging.info(f'Parsed {len(results) - len(failed)}/{len(results)} headers in {wall:.3f}s ({total:.3f}s in {numWorkers} jobs)')
+    if opts.cacheDir:
+      cache = ParseCache(opts.cacheDir, opts.cacheSize, opts.version)
+      cache.evict()
+      hits   = sum(x.hits for x in results)
+      misses = sum(x.misses for x in results)
+      logging.info(f'Parse cache {opts.cacheDir}: {hits} hits, {misses} misses, {cache.evicted} evicted')
+
+    if self.args.depfile and not failed:
+      writeDepfile(self.args.depfile, [x.output for x in results], [x.input for x in results])
+
+    return 1 if failed else 0
+
   def run(self) -> int:
     ### Config setup
     if self.args.config:
@@ -69,32 +207,110 @@ class EnumGenerator:
       out_file: Path = self.args.output
       in_file  = in_file.resolve()
       out_file = out_file.resolve()
-      p = parser.Parser(in_file)
-      e = enums.Enums()
-      p.parse()
-      e.parseScope(p)
 
-      out = {
-        'file': in_file.as_posix(),
-        'enums': e.enums
-      }
+      opts  = self.compileOptions()
+      if opts.followIncludes:
+        return self.runBatch([(in_file, out_file)], 1)
+
+      cache = None
+      if opts.cacheDir:
+        cache = ParseCache(opts.cacheDir, opts.cacheSize, opts.version)
+
+      compileHeader(in_file, out_file, opts, cache)
+      if self.args.depfile:
+        writeDepfile(self.args.depfile, [out_file], [in_file])
 
-      out_file.write_text(json.dumps(out, indent=2))
       logging.info(f'Wrote file {out_file}')
+      logging.info(f'Peak RSS: {peakRSS()}')
+      if cache:
+        cache.evict()
+        cache.logStats()
+
+    ### Parse many headers in parallel
+    if 'jobs' in vars(self.args):
+      try:
+        jobs = self.batchJobs()
+      except ValueError as err:
+        logging.error(err)
+        return 1
+
+      return self.runBatch(jobs, self.args.jobs if self.args.jobs > 0 else availableCores())
+
+    ### Serve the other commands
+    if 'idleTimeout' in vars(self.args):
+      path = self.args.socket if self.args.socket is not None else client.socketPath(create=True)
+      if not path:
+        logging.error('Unix sockets are not supported or the socket directory can be accessed by other users')
+        return 1
+      return server.serve(path, self.args.idleTimeout)
+
+    ### Link enum lists
+    if 'database' in vars(self.args):
+      linker = Linker(self.args.database.resolve())
+      linker.loadPrevious()
+      try:
+        for i in self.args.enumFiles:
+          linker.add(i)
+      except (OSError, ValueError, KeyError, TypeError) as err:
+        logging.error(f'Failed to link {self.args.database}: {err}')
+        return 1
+
+      for i in linker.conflicts:
+        logging.error(i)
+      if linker.conflicts:
+        return 1
+
+      linker.write()
+      if self.args.depfile:
+        writeDepfile(self.args.depfile, [linker.out], sorted(linker.loaded))
 
     ### Generate C++ files
     if 'cls' in vars(self.args):
       assert isinstance(self.args.hpp, Path)
       assert isinstance(self.args.cpp, Path)
-      gen = generate.Generator(self.args.hpp, self.args.cpp, self.cfg, self.args.cls)
-      for i in self.args.enumFiles:
-        data = json.loads(i.read_text())
+      numJobs       = self.args.numJobs if self.args.numJobs > 0 else availableCores()
+      fragmentCache = FragmentCache(self.args.cache, self.args.cacheSize << 20, VERSION) if self.args.cache else None
+      try:
+        gen = generate.Generator(self.args.hpp, self.args.cpp, self.cfg, self.args.cls, self.args.shards, self.args.shardPerInput, numJobs, fragmentCache)
+      except ValueError as err:
+        logging.error(f'Invalid config: {err}')
+        return 1
+      loaded: T.Set[Path] = set()
+
+      # Shared enums of included headers are referenced and only added once
+      def addFile(fp: Path) -> None:
+        fp = fp.resolve()
+        if fp in loaded:
+          return
+
+        loaded.add(fp)
+        if intermediate.isCompact(fp):
+          with intermediate.CompactReader(fp) as r:
+            for inc in r.includes:
+              addFile(Path(inc))
+            for member, enums in r.groups(gen.selection.selected):
+              gen.addEnums(member.file, enums, member.source)
+          return
+
+        data = json.loads(fp.read_text())
 
         if isinstance(data, dict) and 'file' in data and 'enums' in data:
           assert isinstance(data['file'], str)
           assert isinstance(data['enums'], list)
-          gen.addEnums(data['file'], data['enums'])
+          for inc in data.get('includes', []):
+            addFile(Path(inc))
+          gen.addEnums(data['file'], [EnumInfo.fromJSON(x) for x in data['enums']], fp.as_posix())
+
+      try:
+        for i in self.args.enumFiles:
+          addFile(i)
+      except (OSError, ValueError) as err:
+        logging.error(f'Failed to read the enum lists: {err}')
+        return 1
 
       gen.write()
+      if self.args.depfile:
+        deps = sorted(loaded) + ([self.args.config.resolve()] if self.args.config else [])
+        writeDepfile(self.args.depfile, [gen.hppFile, gen.cppFile] + gen.shardFiles, deps)
 
     return 0
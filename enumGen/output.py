@@ -0,0 +1,60 @@
+import os
+import filecmp
+import logging
+import tempfile
+import contextlib
+from pathlib import Path
+import typing as T
+
+# Opens a temporary file next to path for writing. Once it is closed, it
+# replaces path atomically, but only if the content changed. An unchanged
+# output keeps its mtime, so build systems with restat do not rebuild
+# everything that depends on it
+@contextlib.contextmanager
+def updateFile(path: Path) -> T.Iterator[T.TextIO]:
+  with _update(path, 'w') as fp:
+    yield T.cast(T.TextIO, fp)
+
+# Same as updateFile for binary files
+@contextlib.contextmanager
+def updateBinaryFile(path: Path) -> T.Iterator[T.BinaryIO]:
+  with _update(path, 'wb') as fp:
+    yield T.cast(T.BinaryIO, fp)
+
+@contextlib.contextmanager
+def _update(path: Path, mode: str) -> T.Iterator[T.IO[T.Any]]:
+  fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+  try:
+    with os.fdopen(fd, mode) as fp:
+      yield fp
+
+    if path.is_file() and filecmp.cmp(tmp, path, shallow=False):
+      logging.info(f'{path.name} is unchanged')
+      os.unlink(tmp)
+      return
+
+    os.chmod(tmp, path.stat().st_mode & 0o777 if path.is_file() else 0o666 & ~umask())
+    os.replace(tmp, path)
+  except BaseException:
+    Path(tmp).unlink(missing_ok=True)
+    raise
+
+def writeFile(path: Path, text: str) -> None:
+  with updateFile(path) as fp:
+    fp.write(text)
+
+def umask() -> int:
+  mask = os.umask(0)
+  os.umask(mask)
+  return mask
+
+# Escapes a path for a Makefile rule
+def depEscape(path: Path) -> str:
+  return path.as_posix().replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+# Writes a Makefile style depfile: all targets depend on all deps
+def writeDepfile(depfile: Path, targets: T.Sequence[Path], deps: T.Sequence[Path]) -> None:
+  rule = ' '.join(depEscape(x) for x in targets) + ':'
+  for i in deps:
+    rule += ' \\\n  ' + depEscape(i)
+  writeFile(depfile, rule + '\n')
@@ -1,21 +1,275 @@
 import logging
 import sys
 import re
+from enum import Enum
 from pathlib import Path
 import typing as T
 
+_lexRegex = re.compile(r'''
+    (?P<ws>[ \t\n]+)
+  | (?P<block>/\*)
+  | (?P<line>//)
+  | (?P<cont>\\\n)
+  | (?P<esc>\\")
+  | (?P<pp>\#)
+  | (?P<attr>\[\[)
+  | (?P<align>alignas[ \t\n]*\()
+  | (?P<str>")
+''', re.VERBOSE)
+
+# a token at the end of a chunk that may continue in the next chunk
+_partialRegex = re.compile(r'(/|\\|\[|a(l(i(g(n(a(s[ \t\n]*)?)?)?)?)?)?)\Z')
+
+_ppEndRegex      = re.compile(r'\n|/\*|//')
+_includeRegex    = re.compile(r'[ \t]*include[ \t]*(<[^>\n]*>|"[^"\n]*")')
+_wordRunRegex    = re.compile(r'[a-zA-Z_0-9 ]+')
+_inheritRegex    = re.compile(r'(class |struct )([a-zA-Z_0-9]+)')
+_enumPrefixRegex = re.compile(r'(typedef +)?')
+
+_accessMap = {
+  'public':    'normal',
+  'protected': 'hidden',
+  'private':   'hidden',
+}
+
+class EventType(Enum):
+  PUSH_SCOPE = 1
+  POP_SCOPE  = 2
+  ACCESS     = 3
+  ENUM       = 4
+
+class ScopeEvent(T.NamedTuple):
+  type:  EventType
+  value: str = ''
+
+# cleanup the source code: remove strings, templates, comments, defines
+# makes it a lot easier to parse later
+#
+# Single pass over the buffer: every removed construct is found with one
+# search and skipped with str.find, and every failed lookahead ('[[' without
+# ']]', 'alignas(' without ')') is cached, so the whole step is O(n).
+#
+# The input can be fed in arbitrary chunks: the lexer remembers whether it is
+# inside a comment, string or define and carries incomplete tokens over to the
+# next chunk. Lookaheads that do not complete within maxLookahead characters
+# are treated as failed, which bounds the memory used while streaming.
+class Lexer:
+  def __init__(self, maxLookahead: int = 1 << 16) -> None:
+    self.maxLookahead          = maxLookahead
+    self.mode                  = ''     # '', 'block', 'line', 'pp', 'ppblock' or 'str'
+    self.tail                  = ''     # unprocessed input from the last chunk
+    self.lastSpace             = False
+    self.skipBrace             = False  # stripInheritance: drop everything up to the next '{'
+    self.runTail               = ''     # stripInheritance: unprocessed output from the last chunk
+    self.includes: T.List[str] = []     # '"file.h"' and '<file.h>' includes in the order they were found
+
+  # Process the next chunk and return the cleaned output. final must be set for the last chunk
+  def feed(self, chunk: str, final: bool = False) -> str:
+    return self.stripInheritance(self.lex(chunk, final), final)
+
+  def lex(self, chunk: str, final: bool) -> str:
+    data = self.tail + chunk
+    size = len(data)
+    out: T.List[str] = []
+    pos = 0
+    nextBracket = -1  # cached position of the next ']'
+    nextParen   = -1  # cached position of the next ')'
+
+    while True:
+      if self.mode in ['block', 'ppblock']:
+        end = data.find('*/', pos)
+        if end < 0:
+          pos = size - 1 if size - 1 >= pos and data.endswith('*') else size
+          break
+        pos = end + 2
+        self.mode = 'pp' if self.mode == 'ppblock' else ''
+
+      elif self.mode == 'line':
+        end = data.find('\n', pos)
+        if end < 0:
+          pos = size
+          break
+        pos = end  # keep the newline
+        self.mode = ''
+
+      elif self.mode == 'str':
+        # remove strings (\" does not terminate the string)
+        end = data.find('"', pos)
+        if end < 0:
+          pos = size - 1 if size - 1 >= pos and data.endswith('\\') else size
+          break
+        pos = end + 1
+        if end == 0 or data[end - 1] != '\\':
+          self.mode = ''
+
+      elif self.mode == 'pp':
+        # remove defines (including line continuations and block comments)
+        nl = _ppEndRegex.search(data, pos)
+        if nl is None:
+          pos = size - 1 if size - 1 >= pos and data[-1] in '\\/' else size
+          break
+        pos = nl.end()
+        if nl.group() == '/*':
+          self.mode = 'ppblock'
+        elif nl.group() == '//':
+          self.mode = 'line'
+        elif nl.start() == 0 or data[nl.start() - 1] != '\\':
+          pos -= 1  # keep the newline
+          self.mode = ''
+
+      else:
+        m = _lexRegex.search(data, pos)
+        end = size
+
+        # Do not process a token that may continue in the next chunk
+        if not final and (m is None or (m.lastgroup == 'ws' and m.end() == size)):
+          partial = _partialRegex.search(data, pos)
+          if partial:
+            m, end = None, partial.start()
+
+        if m is None:
+          if end > pos:
+            out.append(data[pos:end])
+            self.lastSpace = False
+          pos = end
+          break
+
+        if m.start() > pos:
+          out.append(data[pos:m.start()])
+          self.lastSpace = False
+
+        kind = m.lastgroup
+        pos = m.end()
+
+        if kind == 'ws':
+          if not self.lastSpace:
+            out.append(' ')
+            self.lastSpace = True
+
+        elif kind == 'pp':
+          # remember includes, the whole line must be available for this
+          if data.find('\n', pos) < 0 and self.canWait(final, size - m.start()):
+            pos = m.start()
+            break
+          inc = _includeRegex.match(data, pos)
+          if inc:
+            self.includes += [inc.group(1)]
+          self.mode = 'pp'
+
+        elif kind in ['block', 'line', 'str']:
+          self.mode = str(kind)
+
+        elif kind == 'attr':
+          # c++11 attributes
+          if nextBracket < pos:
+            nextBracket = data.find(']', pos)
+            nextBracket = size if nextBracket < 0 else nextBracket
+          if nextBracket + 1 >= size and self.canWait(final, size - m.start()):
+            pos = m.start()
+            break
+          if data.startswith(']]', nextBracket):
+            pos = nextBracket + 2
+          else:
+            pos = m.start() + 1
+            out.append('[')
+            self.lastSpace = False
+
+        elif kind == 'align':
+          if nextParen < pos:
+            nextParen = data.find(')', pos)
+            nextParen = size if nextParen < 0 else nextParen
+          if nextParen >= size and self.canWait(final, size - m.start()):
+            pos = m.start()
+            break
+          if nextParen < size:
+            pos = nextParen + 1
+            if not self.lastSpace:
+              out.append(' ')
+              self.lastSpace = True
+          else:
+            pos = m.start() + 1
+            out.append('a')
+            self.lastSpace = False
+
+        # 'cont' and 'esc' are simply dropped
+
+    self.tail = '' if final else data[pos:]
+    return ''.join(out)
+
+  # True if nothing is carried over to the next chunk, i.e. the next chunk is
+  # processed exactly like the start of a new file
+  def idle(self) -> bool:
+    return self.mode == '' and not self.tail and not self.runTail and not self.skipBrace
+
+  # Check whether an incomplete lookahead of length n can be continued in the next chunk
+  def canWait(self, final: bool, n: int) -> bool:
+    return not final and n <= self.maxLookahead
+
+  # remove inherited class definitions: 'class A final : public B {' --> 'class A {'
+  # (expects whitespace to be already collapsed)
+  def stripInheritance(self, data: str, final: bool) -> str:
+    data = self.runTail + data
+    self.runTail = ''
+    out: T.List[str] = []
+    copied = 0
+    pos = 0
+
+    if self.skipBrace:
+      end = data.find('{')
+      if end < 0:
+        return ''
+      self.skipBrace = False
+      copied = pos = end
+
+    while True:
+      run = _wordRunRegex.search(data, pos)
+      if run is None:
+        break
+
+      pos = run.end()
+      if pos == len(data) and self.canWait(final, pos - run.start()):
+        # the run may continue (or be followed by ':') in the next chunk
+        out.append(data[copied:run.start()])
+        self.runTail = data[run.start():]
+        return ''.join(out)
+
+      if not data.startswith(':', pos):
+        continue
+
+      m = _inheritRegex.search(data, run.start(), pos)
+      if m is None:
+        continue
+
+      out += [data[copied:m.start()], m.group(1), m.group(2), ' ']
+      end = data.find('{', pos)
+      if end < 0:
+        self.skipBrace = not final
+        return ''.join(out)
+      pos = copied = end
+
+    out.append(data[copied:])
+    return ''.join(out)
+
 # Extract enums from C++ source code
 # NOTE: this is not a complete C++ parser!
 #       it just detects namespace scopes (namespace, class, struct),
 #       removes everything except enums and puts the result into a list
 #
-# the output list contains #!PUSH_SCOPE=<name> and #!POP_SCOPE
+# the output list contains PUSH_SCOPE(<name>), POP_SCOPE and ENUM(<statement>) events
 class Parser:
-  def __init__(self, fp: Path):
-    self.scopeList: T.List[str] = []
-    self.file                   = fp
-    self.data                   = fp.read_text()
-    self.it                     = 0
+  # chunkSize > 0 enables the streaming mode (see stream())
+  def __init__(self, fp: Path, chunkSize: int = 0):
+    self.scopeList: T.List[ScopeEvent]          = []
+    self.source:    T.Optional[T.Iterator[str]] = None  # cleaned chunks (streaming mode)
+    self.file                                   = fp
+    self.chunkSize                              = chunkSize
+    self.data                                   = fp.read_text() if chunkSize <= 0 else ''
+    self.it                                     = 0
+    self.mark                                   = -1  # keep self.data from here on when refilling
+    self.includes:  T.List[str]                 = []  # raw includes (see Lexer), filled in place while parsing
+    self.stack:     T.List[str]                 = []  # scopes opened in scopeWalker
+    self.hidden                                 = 0   # scopeCleaner: depth inside a hidden scope
+    self.boundary                               = -1  # self.data position after the last ';' that ended a statement
 
   def skipWhitespace(self) -> None:
     ws = [' ', '\t', '\n']
@@ -53,46 +307,56 @@ class Parser:
 
   # Check if the end was reached
   def notEOF(self) -> bool:
+    return self.it < len(self.data) or self.refill()
+
+  # Load the next cleaned chunk into self.data (streaming mode only)
+  def refill(self) -> bool:
+    while self.source is not None and self.it >= len(self.data):
+      chunk = next(self.source, None)
+      if chunk is None:
+        self.source = None
+        break
+
+      keep = self.data[self.mark:] if self.mark >= 0 else ''
+      self.it       -= len(self.data) - len(keep)
+      self.boundary -= len(self.data) - len(keep)
+      self.mark = 0 if self.mark >= 0 else -1
+      self.data = keep + chunk
+
     return self.it < len(self.data)
 
+  # True if scopeWalker consumed all data and stopped right after a statement.
+  # The walk then continues with the next chunk like a new walk with the same
+  # scope stack
+  def atBoundary(self) -> bool:
+    return self.mark < 0 and self.boundary == self.it == len(self.data)
+
+  # Read, decode and clean the input file in chunks of self.chunkSize characters
+  def readChunks(self) -> T.Iterator[str]:
+    lexer = Lexer()
+    lexer.includes = self.includes
+    with self.file.open() as fp:
+      while True:
+        chunk = fp.read(self.chunkSize)
+        if not chunk:
+          break
+        yield lexer.feed(chunk)
+
+    yield lexer.feed('', final=True)
+
   # cleanup the source code: remove strings, templates, comments, defines
   # makes it a lot easier to parse later
   def cleanup(self) -> None:
-    newData = ''
-
-    self.data = re.sub('/\\*([^*]|\\*[^/])*\\*/',  '',  self.data)  # remove c style comments
-    self.data = re.sub('//[^\n]*',                 '',  self.data)  # remove c++ comments
-    self.data = re.sub('\\\\\n',                   '',  self.data)  # remove \\n  (for easy multi line strings and defines)
-    self.data = re.sub('\\\\"',                    '',  self.data)  # remove \"   (for easy string removal
-    self.data = re.sub('#[^\n]*',                  '',  self.data)  # remove defines
-    self.data = re.sub('\\[\\[[^]]*\\]\\]',        '',  self.data)  # c++11 attributes
-    self.data = re.sub('\t',                       ' ', self.data)  # tabs to spaces
-    self.data = re.sub('alignas[ \n]*\\([^)]*\\)', ' ', self.data)  # alignas
-
-    ### Remove strings (regex are too greedy)
-    while (self.notEOF()):
-      if (self.get() == '"'):
-        self.advance()
-        while (self.notEOF() and self.get() != '"'): self.advance()
-        self.advance()
-        continue
-
-      newData += self.get()
-      self.advance()
-
-    self.data = newData
+    lexer = Lexer()
+    lexer.includes = self.includes
+    self.data = lexer.feed(self.data, final=True)
     self.it = 0
 
-    # remove inherited class definitions
-    self.data = re.sub('\n', ' ', self.data)  # remove newlines
-    self.data = re.sub('(class |struct ) *([a-zA-Z_0-9]+)[a-zA-Z_0-9 ]*:[^{]*', '\\1 \\2 ', self.data)
-    self.data = re.sub(' +', ' ', self.data)  # one space only
-
   # Make the C++ scopes more readable and remove funcrion bodies, etc.
-  # Outputs a list with just c++ commands, #!PUSH_SCOPE=<id>, #!POP_SCOPE and #!ACC=<normal|hidden>
-  def scopeWalker(self) -> T.List[str]:
-    newData = ''
-    stack: T.List[str] = []
+  # Yields PUSH_SCOPE(<id>), POP_SCOPE, ACCESS(<normal|hidden>) and ENUM(<c++ statement>) events
+  def scopeWalker(self) -> T.Iterator[ScopeEvent]:
+    stmt: T.List[str] = []  # the current (not yet ';' terminated) statement
+    stack = self.stack
 
     while (self.notEOF()):
       self.skipWhitespace()
@@ -102,17 +366,22 @@ class Parser:
         # Replace block with ;
         if (self.get() == '{'):
           self.skipStack('{', '}')
-          newData += ';'
+          stmt = []
           continue
 
         # A scope we care about closed
         if (self.get() == '}'):
-          newData += '#!POP_SCOPE;'
+          yield ScopeEvent(EventType.POP_SCOPE)
+          stmt = []
           stack.pop()
           self.advance()
           continue
 
-        newData += self.get()
+        if (self.get() == ';'):
+          stmt = []
+          self.boundary = self.it + 1
+        else:
+          stmt.append(self.get())
         self.advance()
 
       word = self.getWord()
@@ -131,89 +400,104 @@ class Parser:
 
         # Meh :( either using or forward declaration ==> skip we wont need it anyway
         if (self.get() == ';'):
-          newData += ';'  # just to be on the safe side
+          stmt = []
+          self.boundary = self.it + 1
           self.advance()
 
         # Begin scope stack
         elif (self.get() == '{'):
-          newData += "#!PUSH_SCOPE=" + id + ';'
-          if (word == 'class'):
-            newData += '#!ACC=hidden;'
-          else:
-            newData += '#!ACC=normal;'
+          yield ScopeEvent(EventType.PUSH_SCOPE, id)
+          yield ScopeEvent(EventType.ACCESS, 'hidden' if word == 'class' else 'normal')
+          stmt = []
           stack.append(id)
           self.advance()
 
       ### Handle enums
       elif word == 'enum':
-        newData += 'enum '
+        self.mark = self.it
         while (self.notEOF() and self.get() != ';'):
-          newData += self.get()
           self.advance()
 
-        newData += ';'
+        body = self.data[self.mark:self.it]
+        self.mark = -1
+
+        # only plain enum declarations and typedefs are interesting
+        prefix = ''.join(stmt).lstrip(' ')
+        if _enumPrefixRegex.fullmatch(prefix):
+          yield ScopeEvent(EventType.ENUM, prefix + 'enum ' + body)
+
+        stmt = []
+        if self.get() == ';':
+          self.boundary = self.it + 1
         self.advance()
 
       ### Remove function calls
       elif self.get() == '(':
         self.skipStack('(', ')')
-        newData += ';'
+        stmt = []
+
+      ### Access specifiers (public:, private :, ...)
+      elif word.rstrip(':') in _accessMap and (word.endswith(':') or self.get() == ':'):
+        if not word.endswith(':'):
+          self.advance()
+        yield ScopeEvent(EventType.ACCESS, _accessMap[word.rstrip(':')])
+        stmt = []
 
       ### Word not found ==> append for now
       else:
-        newData += word + ' '
-
-    # Final cleanup
-    newData = re.sub('public *:', '#!ACC=normal;', newData)
-    newData = re.sub('(private|protected) *:', '#!ACC=hidden;', newData)
-    newData = re.sub(';[ ;]+', ';', newData)  # remove double ;
-    newData = re.sub(';[^#;]*#!', ';#!', newData)  # remove stuff in front of #!<command>
-    return newData.split(';')
+        stmt += [word, ' ']
 
   # Removes private scopes, and non enum c++ statements
-  def scopeCleaner(self, li: T.List[str]) -> T.List[str]:
-    # remove all non control and non enum entries
-    reg = re.compile('(^#![A-Z_]+.*$)|(^(typedef +)?enum +)')
-    li = [i for i in li if reg.match(i)]
-
-    newList = []
-    stack = 0
-
-    for i in li:
+  def scopeCleaner(self, events: T.Iterable[ScopeEvent]) -> T.Iterator[ScopeEvent]:
+    for i in events:
       # Remove entire hidden scopes
-      if (stack > 1):
-        if (i == '#!POP_SCOPE'):
-          stack -= 1
-        elif (re.search('#!PUSH_SCOPE', i)):
-          stack += 1
+      if (self.hidden > 1):
+        if (i.type == EventType.POP_SCOPE):
+          self.hidden -= 1
+        elif (i.type == EventType.PUSH_SCOPE):
+          self.hidden += 1
 
         continue
 
-      if (stack == 1):
-        if (i == '#!POP_SCOPE' or i == '#!ACC=normal'):
-          stack = 0
-        elif (re.search('#!PUSH_SCOPE', i)):
-          stack += 1
+      isNormal = i.type == EventType.ACCESS and i.value == 'normal'
+      isHidden = i.type == EventType.ACCESS and i.value == 'hidden'
+
+      if (self.hidden == 1):
+        if (i.type == EventType.POP_SCOPE or isNormal):
+          self.hidden = 0
+        elif (i.type == EventType.PUSH_SCOPE):
+          self.hidden += 1
           continue
         else:
           continue
 
-      if (i == '#!ACC=normal'): continue  # Remove
-      if (i == '#!ACC=hidden'):
-        stack = 1
+      if (isNormal): continue  # Remove
+      if (isHidden):
+        self.hidden = 1
         continue
 
-      newList.append(i)
-
-    return newList
+      yield i
 
   def parse(self) -> None:
     logging.info('Parsing file {}'.format(self.file.name))
     self.it = 0
 
     self.cleanup()
-    self.scopeList = self.scopeWalker()
-    self.scopeList = self.scopeCleaner(self.scopeList)
-
-  def getResult(self) -> T.List[str]:
+    self.scopeList = list(self.scopeCleaner(self.scopeWalker()))
+
+  # Streaming mode: the file is read, cleaned and walked chunk by chunk and the
+  # events are generated as soon as they are found. Memory usage only depends
+  # on the chunk size and the size of the largest enum, not on the file size.
+  def stream(self) -> T.Iterator[ScopeEvent]:
+    logging.info('Streaming file {} in chunks of {} characters'.format(self.file.name, self.chunkSize))
+    return self.streamChunks(self.readChunks())
+
+  # Walks the already cleaned chunks of source (see stream())
+  def streamChunks(self, source: T.Iterator[str]) -> T.Iterator[ScopeEvent]:
+    self.data   = ''
+    self.it     = 0
+    self.source = source
+    return self.scopeCleaner(self.scopeWalker())
+
+  def getResult(self) -> T.List[ScopeEvent]:
     return self.scopeList
@@ -0,0 +1,67 @@
+import typing as T
+
+# Minimal perfect hashing (hash and displace) for the names of an enum
+#
+# All names are hashed with a seeded 32 bit FNV-1a and put into buckets by
+# their hash. Starting with the largest bucket, every bucket gets the first
+# displacement that maps all of its names to free slots. A lookup is then
+#   slot = mix(hash(str, seed), displacements[hash % len(displacements)]) % len(slots)
+# followed by one string compare against the name in slot. The same functions
+# are generated in C++ (see generate.py).
+
+_mask = 0xFFFFFFFF
+
+# Average number of names per bucket: smaller is faster to build, larger is more compact
+_bucketSize = 4
+
+class PerfectHash(T.NamedTuple):
+  seed:          int
+  displacements: T.List[int]
+  slots:         T.List[int]  # slot --> index of the name
+
+def fnv1a(name: str, seed: int) -> int:
+  h = 2166136261 ^ seed
+  for c in name.encode():
+    h = ((h ^ c) * 16777619) & _mask
+  return h
+
+def mix(h: int, d: int) -> int:
+  h ^= (d * 0x9E3779B9) & _mask
+  h ^= h >> 16
+  h = (h * 0x85EBCA6B) & _mask
+  return h ^ (h >> 13)
+
+def build(names: T.Sequence[str]) -> PerfectHash:
+  n = len(names)
+  for seed in range(1 << 16):
+    hashes = [fnv1a(x, seed) for x in names]
+    # names with the same hash can not be separated by any displacement
+    if len(set(hashes)) != n:
+      continue
+
+    numBuckets = max(1, (n + _bucketSize - 1) // _bucketSize)
+    buckets: T.List[T.List[int]] = [[] for _ in range(numBuckets)]
+    for i, h in enumerate(hashes):
+      buckets[h % numBuckets] += [i]
+
+    displacements = [0] * numBuckets
+    slots = [-1] * n
+    for b in sorted(range(numBuckets), key=lambda x: -len(buckets[x])):
+      if not buckets[b]:
+        break
+
+      for d in range(1 << 16):
+        pos = [mix(hashes[i], d) % n for i in buckets[b]]
+        if len(set(pos)) == len(pos) and all(slots[x] < 0 for x in pos):
+          break
+      else:
+        break  # try the next seed
+
+      displacements[b] = d
+      for i, x in zip(buckets[b], pos):
+        slots[x] = i
+
+    if all(x >= 0 for x in slots):
+      return PerfectHash(seed, displacements, slots)
+
+  raise RuntimeError('failed to build a perfect hash')
@@ -0,0 +1,157 @@
+import locale
+import hashlib
+import logging
+from pathlib import Path
+import typing as T
+from . import parser, enums
+from .enums import EnumInfo
+
+# Regions smaller than this are merged with the next one
+minRegionSize = 4096
+
+# Everything the parser carries over a region boundary (the lexer is idle there)
+class ScopeState(T.NamedTuple):
+  stack:  T.List[str] = []  # Parser.stack
+  hidden: int         = 0   # Parser.hidden
+  scopes: T.List[str] = []  # the scopeStack of Enums.iterScope
+
+class Region(T.NamedTuple):
+  start:    int  # byte span in the header
+  end:      int
+  hash:     str
+  state:    ScopeState  # the parser state at start
+  enums:    T.List[EnumInfo]
+  includes: T.List[str]
+
+  def toJSON(self) -> T.List[T.Any]:
+    return [self.start, self.end, self.hash, len(self.enums), self.includes, list(self.state)]
+
+# The parsed bytes do not end with the expected state
+class StateMismatch(Exception):
+  pass
+
+def regionHash(data: bytes, start: int, end: int, version: str) -> str:
+  return hashlib.sha1(version.encode() + b'\0' + data[start:end]).hexdigest()
+
+# Same as Path.read_text (universal newlines)
+def decode(data: bytes) -> str:
+  return data.decode(locale.getpreferredencoding(False)).replace('\r\n', '\n').replace('\r', '\n')
+
+# Parses data[begin:end] starting with state. The input is lexed and walked in
+# chunks that end with a ';' and a new region starts after every chunk that
+# leaves the lexer idle and the parser between two statements. Only then the
+# state at the boundary is completely described by a ScopeState.
+#
+# end is the end of the file if endState is None. Otherwise end must be such a
+# boundary with endState, else None is returned
+def parseRegions(file: Path, data: bytes, begin: int, end: int, state: ScopeState, endState: T.Optional[ScopeState], version: str) -> T.Optional[T.List[Region]]:
+  final = endState is None
+  p = parser.Parser(file, minRegionSize)
+  p.stack  = list(state.stack)
+  p.hidden = state.hidden
+  scopeStack = list(state.scopes)
+
+  lexer = parser.Lexer()
+  found: T.List[EnumInfo] = []
+  cuts = [(begin, 0, 0, state)]  # (offset, len(found), len(lexer.includes), state)
+
+  def chunks() -> T.Iterator[str]:
+    pos = begin
+    while pos < end:
+      # there is no point in checking for a boundary inside of a small region
+      semi = data.find(b';', max(pos, cuts[-1][0] + minRegionSize - 1), end)
+      stop = end if semi < 0 else semi + 1
+      yield lexer.feed(decode(data[pos:stop]), final and stop == end)
+
+      # resumed once the chunk was walked
+      pos = stop
+      if not (final and pos == end) and lexer.idle() and p.atBoundary():
+        cuts.append((pos, len(found), len(lexer.includes), ScopeState(list(p.stack), p.hidden, list(scopeStack))))
+
+    if final and begin == end:
+      yield lexer.feed('', final=True)
+
+    # stop before the walker treats end as the end of the file
+    if not final and (cuts[-1][0] != end or cuts[-1][3] != endState):
+      raise StateMismatch()
+
+  try:
+    for i in enums.Enums().iterScope(p.streamChunks(chunks()), scopeStack):
+      found.append(i)
+  except StateMismatch:
+    return None
+
+  if final:
+    cuts.append((end, len(found), len(lexer.includes), ScopeState()))
+
+  res: T.List[Region] = []
+  for (start, e1, i1, startState), (stop, e2, i2, _) in zip(cuts, cuts[1:]):
+    res += [Region(start, stop, regionHash(data, start, stop, version), startState, found[e1:e2], lexer.includes[i1:i2])]
+
+  return res
+
+# Reads the regions of a previous result (see compile.writeEnumsJSON)
+def loadRegions(previous: T.Dict[str, T.Any]) -> T.List[Region]:
+  res: T.List[Region] = []
+  oldEnums = [EnumInfo.fromJSON(x) for x in previous['enums']]
+  pos = 0
+  for start, end, hash, numEnums, includes, state in previous['regions']:
+    assert isinstance(start, int) and isinstance(end, int) and isinstance(hash, str) and isinstance(numEnums, int)
+    assert isinstance(includes, list) and all(isinstance(x, str) for x in includes)
+    stack, hidden, scopes = state
+    res += [Region(start, end, hash, ScopeState(list(stack), int(hidden), list(scopes)), oldEnums[pos:pos + numEnums], includes)]
+    pos += numEnums
+
+  assert pos == len(oldEnums) and res and res[0].start == 0
+  return res
+
+# Parses in_file and returns its regions. Only the regions that changed since
+# the previous result are parsed again: the unchanged regions at the start and
+# at the end of the header are found by their hashes and the bytes in between
+# are parsed with the state of the first changed region. If that does not end
+# with the state of the first unchanged region at the end (e.g. a comment was
+# opened), half of the unchanged regions at the end are parsed as well, so
+# even then it takes at most twice as long as parsing the whole header.
+def parse(in_file: Path, previous: T.Optional[T.Dict[str, T.Any]], version: str) -> T.List[Region]:
+  data = in_file.read_bytes()
+  old: T.List[Region] = []
+  if previous is not None:
+    try:
+      old = loadRegions(previous)
+    except (KeyError, TypeError, ValueError, AssertionError):
+      logging.warning(f'Ignoring the invalid regions of the previous result of {in_file.name}')
+
+  if not old:
+    logging.info(f'Parsing file {in_file.name} in regions')
+    res = parseRegions(in_file, data, 0, len(data), ScopeState(), None, version)
+    assert res is not None
+    return res
+
+  # The last region may end in the middle of a statement and is never a prefix
+  numPrefix = 0
+  while numPrefix < len(old) - 1:
+    r = old[numPrefix]
+    if r.end > len(data) or regionHash(data, r.start, r.end, version) != r.hash:
+      break
+    numPrefix += 1
+
+  begin = old[numPrefix].start
+  delta = len(data) - old[-1].end
+  numSuffix = 0
+  while numSuffix < len(old) - numPrefix:
+    r = old[-numSuffix - 1]
+    if r.start + delta < begin or regionHash(data, r.start + delta, r.end + delta, version) != r.hash:
+      break
+    numSuffix += 1
+
+  while True:
+    suffix = old[len(old) - numSuffix:]
+    end    = suffix[0].start + delta if suffix else len(data)
+    middle = parseRegions(in_file, data, begin, end, old[numPrefix].state, suffix[0].state if suffix else None, version)
+    if middle is not None:
+      break
+    numSuffix //= 2
+
+  logging.info(f'Parsed {end - begin} of {len(data)} bytes of {in_file.name} ({len(middle)} of {numPrefix + len(middle) + len(suffix)} regions)')
+  shifted = [x._replace(start=x.start + delta, end=x.end + delta) for x in suffix]
+  return old[:numPrefix] + middle + shifted
@@ -0,0 +1,104 @@
+import re
+import fnmatch
+import typing as T
+from .enums import BitfieldKind
+
+if T.TYPE_CHECKING:
+  from .config import Config
+
+# The switches of the config that can be overridden per enum --> Features
+featureKeys = {'enableFromStr': 'fromStr', 'enableBitfields': 'bitfields', 'enableGetList': 'getList'}
+
+class Features(T.NamedTuple):
+  fromStr:   bool
+  bitfields: bool
+  getList:   bool
+
+# Matches qualified enum names (test::TestClass::ABC) against selectors:
+# exact names, globs (with * ? or [) and regular expressions (re:...). The
+# exact names are looked up in a set and all patterns are compiled into a
+# single regular expression
+class Selector:
+  def __init__(self, selectors: T.List[str]) -> None:
+    self.exact: T.Set[str] = set()
+    patterns: T.List[str] = []
+    for x in selectors:
+      if not isinstance(x, str):
+        raise ValueError(f'invalid selector {x!r}')
+      if x.startswith('re:'):
+        patterns += [x[3:]]
+      elif any(c in x for c in '*?['):
+        patterns += [fnmatch.translate(x)]
+      else:
+        self.exact.add(x)
+
+    try:
+      self.regex = re.compile('|'.join(f'(?:{x})' for x in patterns)) if patterns else None
+    except re.error as err:
+      raise ValueError(f'invalid selector in {selectors}: {err}')
+
+  def match(self, name: str) -> bool:
+    return name in self.exact or (self.regex is not None and self.regex.fullmatch(name) is not None)
+
+# Which enums are generated (include and exclude of the config) and their
+# features (the config flags with the overrides of all matching features
+# selectors, in order). With detectBitfields, sequential enums have no
+# bitfield functions, unless a features selector enables them. Every name
+# is only matched once
+class Selection:
+  def __init__(self, cfg: 'Config') -> None:
+    for key, value in (('include', cfg.include), ('exclude', cfg.exclude)):
+      if not isinstance(value, list):
+        raise ValueError(f'{key} must be a list of selectors, not {value!r}')
+    if not isinstance(cfg.features, dict):
+      raise ValueError(f'features must map selectors to features, not {cfg.features!r}')
+
+    self.default  = Features(cfg.enableFromStr, cfg.enableBitfields, cfg.enableGetList)
+    self.detect   = cfg.detectBitfields
+    self.include  = Selector(cfg.include) if cfg.include else None
+    self.exclude  = Selector(cfg.exclude)
+    self.features: T.List[T.Tuple[Selector, T.Dict[str, bool]]]  = []
+    self.memo:     T.Dict[str, T.Optional[T.Tuple[Features, bool]]] = {}  # name --> (features, bitfields overridden)
+
+    for sel, overrides in cfg.features.items():
+      if not isinstance(overrides, dict) or not all(isinstance(x, bool) for x in overrides.values()):
+        raise ValueError(f'the features of {sel} must map features to true or false, not {overrides!r}')
+      unknown = sorted(set(overrides) - set(featureKeys))
+      if unknown:
+        raise ValueError(f'unknown features {unknown} for {sel} (valid: {", ".join(featureKeys)})')
+      self.features += [(Selector([sel]), {featureKeys[k]: v for k, v in overrides.items()})]
+
+  # The features of the enum or None if it is not selected
+  def lookup(self, name: str, kind: T.Optional[BitfieldKind] = None) -> T.Optional[Features]:
+    res = self.match(name)
+    if res is None:
+      return None
+
+    features, overridden = res
+    if self.detect and kind == BitfieldKind.SEQUENTIAL and not overridden:
+      return features._replace(bitfields=False)
+    return features
+
+  def match(self, name: str) -> T.Optional[T.Tuple[Features, bool]]:
+    if name in self.memo:
+      return self.memo[name]
+
+    res = None
+    if (self.include is None or self.include.match(name)) and not self.exclude.match(name):
+      features   = self.default
+      overridden = False
+      for sel, overrides in self.features:
+        if sel.match(name):
+          features   = features._replace(**overrides)
+          overridden = overridden or 'bitfields' in overrides
+      res = (features, overridden)
+
+    self.memo[name] = res
+    return res
+
+  def selected(self, name: str) -> bool:
+    return self.lookup(name) is not None
+
+  # The number of names that were not selected
+  def numSkipped(self) -> int:
+    return sum(1 for x in self.memo.values() if x is None)
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import shlex
+import socket
+import logging
+import traceback
+import socketserver
+import typing as T
+from . import client
+
+# Keeps the generator loaded for the client (see client.py). Every request is
+# run in a forked child of the server, so parallel requests do not share any
+# state (working directory, logging, config) and start with all modules
+# imported. The server stops once it was idle for idleTimeout seconds or its
+# modules changed.
+
+class Handler(socketserver.BaseRequestHandler):
+  def handle(self) -> None:
+    sock: socket.socket = self.request
+    if client.peerUid(sock) != os.getuid():
+      return
+
+    # a connect without a request checks if the server is running (see serve)
+    try:
+      _, fds, _, _ = socket.recv_fds(sock, 1, 3)
+      request = client.recvMessage(sock)
+    except (OSError, ValueError, EOFError):
+      return
+
+    server = T.cast(Server, self.server)
+    if len(fds) != 3 or request.get('stamp') != server.stamp:
+      client.sendMessage(sock, {'stale': True})
+      return
+
+    logging.info(f'Running {shlex.join(request["argv"])} in {request["cwd"]}')
+    for target, fd in enumerate(fds):
+      os.dup2(fd, target)
+      os.close(fd)
+
+    client.sendMessage(sock, {'exit': runCommand(request)})
+
+# Runs the command of a request in this (forked) process
+def runCommand(request: T.Dict[str, T.Any]) -> int:
+  from .main import EnumGenerator
+
+  os.chdir(request['cwd'])
+  os.environ.clear()
+  os.environ.update(request['env'])
+  os.umask(request['umask'])
+  sys.argv = [sys.argv[0]] + request['argv']
+  for i in logging.root.handlers[:]:
+    logging.root.removeHandler(i)
+
+  try:
+    res = EnumGenerator(request['argv']).run()
+  except SystemExit as err:
+    res = err.code if isinstance(err.code, int) else 0 if err.code is None else 1
+  except BaseException:
+    traceback.print_exc()
+    res = 1
+
+  sys.stdout.flush()
+  sys.stderr.flush()
+  return res
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+  def __init__(self, path: str, idleTimeout: float) -> None:
+    self.path        = path
+    self.idleTimeout = idleTimeout
+    self.stamp       = client.packageStamp()
+    self.lastActive  = time.monotonic()
+    self.timeout     = min(idleTimeout, 1.0)  # of handle_request
+
+    # only the user can connect
+    mask = os.umask(0o077)
+    try:
+      super().__init__(path, Handler)
+    finally:
+      os.umask(mask)
+
+  def process_request(self, request: T.Any, client_address: T.Any) -> None:
+    self.lastActive = time.monotonic()
+    super().process_request(request, client_address)
+
+  def serve(self) -> None:
+    while True:
+      self.handle_request()
+      self.collect_children()
+      if self.active_children:
+        self.lastActive = time.monotonic()
+      elif time.monotonic() - self.lastActive >= self.idleTimeout:
+        logging.info(f'Stopping after {self.idleTimeout}s without requests')
+        return
+      elif client.packageStamp() != self.stamp:
+        logging.info('Stopping because the modules changed')
+        return
+
+# Serves on path until the server is idle. A socket without a server is
+# replaced, a running server is an error
+def serve(path: str, idleTimeout: float) -> int:
+  if os.path.exists(path):
+    try:
+      with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+      logging.error(f'A server is already listening on {path}')
+      return 1
+    except OSError:
+      os.unlink(path)
+
+  with Server(path, idleTimeout) as server:
+    logging.info(f'Listening on {path}')
+    try:
+      server.serve()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      os.unlink(path)
+
+  return 0
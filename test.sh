@@ -42,6 +42,564 @@ test_baseTest() {
   requireOK gcc -shared -o Enum2Str.so Enum2Str.o
 }
 
+test_adversarialInput() {
+  python -c '
+print("/*" + " * long comment\n" * 200000 + "*/")
+print("x = \"unterminated;\n" * 100000)
+print("[[" * 20000 + "alignas(" * 20000 + "class " * 20000)
+' > adversarial.hpp
+  requireOK timeout 60 ../enumGen.py parse adversarial.hpp adversarial.json
+  exists adversarial.json
+  rm -f adversarial.hpp adversarial.json
+}
+
+test_largeEnum() {
+  python -c '
+print("enum Flags { F_A = 1 << 0, F_B = 1 << 1, F_AB = F_A | F_B, F_C = 3, F_NOT_A = ~F_A & 0xFF };")
+print("enum Large {")
+for i in range(20000):
+  print(f"  L_{i} = 0x{i * 7 % 5000:x}," if i % 3 == 0 else f"  L_{i} = L_{i // 2} + 1," if i % 3 == 1 else f"  L_{i},")
+print("};")
+' > large.hpp
+  local START=$SECONDS
+  requireOK timeout 60 ../enumGen.py parse large.hpp large.json
+  msg2 "Parsed 20000 entries in $(( SECONDS - START ))s"
+  requireOK python -c '
+import json, sys
+flags, large = json.load(open("large.json"))["enums"]
+sys.exit(not (flags["entries"]["F_AB"] == 3 and flags["blackList"] == ["F_C"] and flags["entries"]["F_NOT_A"] == 0xFE and len(large["entries"]) == 20000))
+'
+  rm -f large.hpp large.json
+}
+
+test_streamParse() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h vulkan_core_ref.json
+  requireOK ../enumGen.py parse -s --chunk-size 4096 ../test/vulkan_core.h vulkan_core_stream.json
+  requireOK cmp vulkan_core_ref.json vulkan_core_stream.json
+  rm -f vulkan_core_ref.json vulkan_core_stream.json
+}
+
+test_batchParse() {
+  requireOK ../enumGen.py parse ../test/test1.hpp     test1_ref.json
+  requireOK ../enumGen.py parse ../test/vulkan_core.h vulkan_core_ref.json
+  echo '}' > broken.hpp
+  ../enumGen.py batch -j 2 ../test/test1.hpp test1_batch.json broken.hpp broken.json ../test/vulkan_core.h vulkan_core_batch.json &> /dev/null
+  RES=$?
+  (( RES == 0 )) && error "batch did not report the broken header"
+  ../enumGen.py batch ../test/test1.hpp test1_a.json ../test/test1.hpp test1_b.json &> /dev/null
+  RES=$?
+  (( RES == 0 )) && error "batch accepted a duplicate input"
+  requireOK cmp test1_ref.json       test1_batch.json
+  requireOK cmp vulkan_core_ref.json vulkan_core_batch.json
+  rm -f broken.hpp test1_ref.json test1_batch.json vulkan_core_ref.json vulkan_core_batch.json
+}
+
+test_parseCache() {
+  requireOK ../enumGen.py parse                 ../test/vulkan_core.h vulkan_core_ref.json
+  requireOK ../enumGen.py parse --cache cache   ../test/vulkan_core.h vulkan_core_miss.json
+  requireOK ../enumGen.py parse --cache cache   ../test/vulkan_core.h vulkan_core_hit.json
+  requireOK cmp vulkan_core_ref.json vulkan_core_miss.json
+  requireOK cmp vulkan_core_ref.json vulkan_core_hit.json
+  # a parse with warnings is not cached
+  printf 'namespace a {\nenum E { A };\n' > unbalanced.hpp
+  requireOK ../enumGen.py parse --cache cache unbalanced.hpp unbalanced.json 2> /dev/null
+  requireOK ../enumGen.py parse --cache cache unbalanced.hpp unbalanced.json 2> unbalanced.log
+  requireOK grep -q 'scope stack not empty' unbalanced.log
+  requireOK ../enumGen.py batch --cache cache --cache-size 0 ../test/test1.hpp test1_batch.json
+  [[ -z "$(ls cache)" ]] || error "the parse cache was not evicted"
+  rm -rf cache vulkan_core_ref.json vulkan_core_miss.json vulkan_core_hit.json unbalanced.{hpp,json,log} test1_batch.json
+}
+
+test_incrementalParse() {
+  cp ../test/vulkan_core.h incremental.h
+  requireOK ../enumGen.py parse -i incremental.h incremental.json
+  sed -i 's/VK_IMAGE_LAYOUT_GENERAL = 1,/VK_IMAGE_LAYOUT_GENERAL = 1, VK_IMAGE_LAYOUT_INCREMENTAL = 42,/' incremental.h
+  requireOK ../enumGen.py parse -i incremental.h incremental.json
+  requireOK ../enumGen.py parse    incremental.h incremental_ref.json
+  requireOK ../enumGen.py generate Enum2Str incremental.{hpp,cpp} incremental_ref.json
+  mv incremental.cpp incremental_ref.cpp
+  requireOK ../enumGen.py generate Enum2Str incremental.{hpp,cpp} incremental.json
+  requireOK cmp incremental.cpp incremental_ref.cpp
+  requireOK grep -q VK_IMAGE_LAYOUT_INCREMENTAL incremental.cpp
+  rm -f incremental.{h,hpp,cpp,json} incremental_ref.{json,cpp}
+}
+
+test_writeIfUnchanged() {
+  requireOK ../enumGen.py parse --depfile test1.d ../test/test1.hpp unchanged.json
+  requireOK ../enumGen.py generate --depfile gen.d Enum2Str unchanged.{hpp,cpp} unchanged.json
+  touch -d @0 unchanged.{json,hpp,cpp}
+  requireOK ../enumGen.py parse ../test/test1.hpp unchanged.json
+  requireOK ../enumGen.py generate Enum2Str unchanged.{hpp,cpp} unchanged.json
+  [[ "$(stat -c %Y unchanged.json unchanged.hpp unchanged.cpp | sort -u)" == 0 ]] || error "unchanged outputs were rewritten"
+  requireOK grep -q 'test1.hpp' test1.d
+  requireOK grep -q 'unchanged.hpp .*unchanged.cpp:' gen.d
+  rm -f test1.d gen.d unchanged.{json,hpp,cpp}
+}
+
+test_bitfieldFormat() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h bits_vulkan_core.json
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str bits.{hpp,cpp} bits_vulkan_core.json
+  cat > bits_main.cpp <<'EOF'
+#include "bits.cpp"
+
+// the buffer, std::string and std::vector versions must agree, also when truncated
+template <typename E>
+bool same(std::vector<E> _all, std::string (*_str)(uint64_t), size_t (*_buf)(uint64_t, char *, size_t), std::vector<std::string> (*_raw)(uint64_t)) {
+  uint64_t all = 0;
+  for (auto v : _all) {
+    all |= static_cast<uint64_t>(v);
+  }
+  for (uint64_t v : {uint64_t(0), all, all & 0x15, all & ~uint64_t(1)}) {
+    std::string ref = _str(v);
+    if (ref != Enum2Str::stringListToString(_raw(v))) return false;
+    for (size_t n : {size_t(0), size_t(1), size_t(7), ref.size(), ref.size() + 1}) {
+      std::vector<char> buf(n + 1, 'x');
+      if (_buf(v, buf.data(), n) != ref.size()) return false;
+      if (n > 0 && ref.compare(0, n - 1, buf.data()) != 0) return false;
+      if (buf[n] != 'x') return false;
+    }
+  }
+  return true;
+}
+
+int main() {
+  bool ok = true;
+  ok = ok && Enum2Str::VkCullModeFlagBits_toStr(0) == "VK_CULL_MODE_NONE";
+  ok = ok && Enum2Str::VkCullModeFlagBits_toStr(3) == "VK_CULL_MODE_FRONT_AND_BACK";
+  ok = ok && Enum2Str::VkColorComponentFlagBits_toStr(5) == "VK_COLOR_COMPONENT_R_BIT | VK_COLOR_COMPONENT_B_BIT";
+  ok = ok && Enum2Str::VkColorComponentFlagBits_toStr_Raw(0).empty();
+  ok = ok && Enum2Str::VkColorComponentFlagBits_toStr(0x30).empty();
+EOF
+  grep -o 'getAll_[A-Za-z0-9_]*' bits.hpp | awk '{
+    f = substr($1, 8)
+    printf "  ok = ok && same(Enum2Str::%s(), Enum2Str::%s_toStr, Enum2Str::%s_toStr, Enum2Str::%s_toStr_Raw);\n", $1, f, f, f
+  }' >> bits_main.cpp
+  printf '  return ok ? 0 : 1;\n}\n' >> bits_main.cpp
+  requireOK gcc -Wall -Wextra -std=c++17 -o bits_main bits_main.cpp -lstdc++
+  requireOK ./bits_main
+  rm -f bits_vulkan_core.json bits.{hpp,cpp} bits_main{,.cpp}
+}
+
+test_compactFormat() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h cf_vulkan_core.json
+  requireOK ../enumGen.py parse ../test/test1.hpp     cf_test1.json
+  requireOK ../enumGen.py parse --format compact ../test/vulkan_core.h cf_vulkan_core.enums
+  requireOK ../enumGen.py parse --format compact ../test/test1.hpp     cf_test1.enums
+  [[ "$(head -c 7 cf_test1.enums)" == ENUMGEN ]] || error "cf_test1.enums is not in the compact format"
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str cf.{hpp,cpp} cf_vulkan_core.json cf_test1.json
+  mv cf.cpp cf_ref.cpp
+  mv cf.hpp cf_ref.hpp
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str cf.{hpp,cpp} cf_vulkan_core.enums cf_test1.enums
+  requireOK cmp cf.cpp cf_ref.cpp
+  requireOK cmp cf.hpp cf_ref.hpp
+  # a corrupt record is an error (same size, so the index stays valid)
+  sed 's/,\[2,5,6\]\]/,[2,5,9]]/' cf_test1.enums > cf_bad.enums
+  ../enumGen.py generate Enum2Str cf.{hpp,cpp} cf_bad.enums 2> cf.log && error "the corrupt record was accepted"
+  requireOK grep -q 'invalid record of test::ENUM2' cf.log
+  rm -f cf_bad.enums
+  # incremental parsing and followed includes
+  cp ../test/vulkan_core.h cf.h
+  mkdir -p cf_shared
+  requireOK ../enumGen.py parse -i -F -I ../test --format compact --shared-dir cf_shared cf.h cf.enums
+  exists cf_shared/vk_platform-*.enums
+  sed -i 's/VK_IMAGE_LAYOUT_GENERAL = 1,/VK_IMAGE_LAYOUT_GENERAL = 1, VK_IMAGE_LAYOUT_COMPACT = 42,/' cf.h
+  requireOK ../enumGen.py -V parse -i -F -I ../test --format compact --shared-dir cf_shared cf.h cf.enums 2> cf.log
+  requireOK grep -q 'regions)' cf.log
+  requireOK ../enumGen.py generate Enum2Str cf.{hpp,cpp} cf.enums
+  requireOK grep -q VK_IMAGE_LAYOUT_COMPACT cf.cpp
+  rm -rf cf_shared cf.{h,log,hpp,cpp,enums} cf_ref.{hpp,cpp} cf_{vulkan_core,test1}.{json,enums}
+}
+
+test_link() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h link_vulkan_core.json
+  requireOK ../enumGen.py parse --format compact ../test/vulkan_core.h link_vulkan_core.enums
+  requireOK ../enumGen.py parse ../test/test1.hpp link_test1.json
+  # the second vulkan_core list only has duplicates
+  requireOK ../enumGen.py link --depfile link.d link.db link_vulkan_core.json link_test1.json link_vulkan_core.enums
+  requireOK grep -q 'link_test1.json' link.d
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str link.{hpp,cpp} link.db
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str link_ref.{hpp,cpp} link_vulkan_core.json link_test1.json
+  requireOK cmp <(tail -n +10 link.cpp) <(tail -n +10 link_ref.cpp)
+  requireOK gcc -c -Wall -std=c++17 link.cpp
+  # unchanged members are copied and a duplicate takes over once the first list changes
+  requireOK ../enumGen.py -V link link.db link_vulkan_core.json link_test1.json link_vulkan_core.enums 2> link.log
+  requireOK grep -q '(3 unchanged, 119 duplicates)' link.log
+  printf 'enum Small { SMALL_A };\n' > link_a.h
+  requireOK ../enumGen.py parse link_a.h link_vulkan_core.json
+  requireOK ../enumGen.py -V link link.db link_vulkan_core.json link_test1.json link_vulkan_core.enums 2> link.log
+  requireOK grep -q '(2 unchanged, 0 duplicates)' link.log
+  requireOK ../enumGen.py generate Enum2Str link.{hpp,cpp} link.db
+  requireOK grep -q 'Small_toStr' link.cpp
+  requireOK grep -q 'VkFormat_toStr' link.cpp
+  # the same enum with different values
+  printf 'enum Small { SMALL_B };\n' > link_b.h
+  requireOK ../enumGen.py parse link_b.h link_b.json
+  ../enumGen.py link link_conflict.db link_vulkan_core.json link_b.json 2> link.log && error "conflicting enums were linked"
+  requireOK grep -q 'Small of .*link_b.json conflicts with' link.log
+  exists link.db
+  [ -e link_conflict.db ] && error "link_conflict.db was written"
+  rm -f link.{d,db,log,hpp,cpp,o} link_ref.{hpp,cpp} link_vulkan_core.{json,enums} link_test1.json link_{a,b}.h link_b.json
+}
+
+test_constexprLists() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h cl_vulkan_core.json
+  sed 's/"indent"/"constexprLists": true, "indent"/' ../test/cfg.json > cl_cfg.json
+  requireOK ../enumGen.py -c cl_cfg.json generate Enum2Str cl.{hpp,cpp} cl_vulkan_core.json
+  # usable in constant expressions and the same object in every translation unit
+  cat > cl_main.cpp <<'EOF'
+#include "cl.hpp"
+using namespace test;
+
+static_assert(Enum2Str::VkCullModeFlagBits_count == 5);
+static_assert(Enum2Str::getAll_VkCullModeFlagBits().size() == Enum2Str::VkCullModeFlagBits_count);
+static_assert(Enum2Str::getAll_VkCullModeFlagBits()[3] == VK_CULL_MODE_FRONT_AND_BACK);
+
+const void *other();
+
+int main() {
+  return other() == &Enum2Str::getAll_VkFormat() && Enum2Str::getAll_VkFormat()[1] == VK_FORMAT_R4G4_UNORM_PACK8 ? 0 : 1;
+}
+EOF
+  printf '#include "cl.hpp"\nconst void *other() { return &test::Enum2Str::getAll_VkFormat(); }\n' > cl_other.cpp
+  requireOK gcc -Wall -std=c++17 -o cl_main cl_main.cpp cl_other.cpp cl.cpp -lstdc++
+  requireOK ./cl_main
+  rm -f cl_vulkan_core.json cl_cfg.json cl.{hpp,cpp} cl_main{,.cpp} cl_other.cpp
+}
+
+test_followIncludes() {
+  mkdir -p follow
+  requireOK ../enumGen.py parse -F --shared-dir follow ../test/vulkan_core.h vulkan_core_follow.json
+  exists follow/vk_platform-*.json
+  requireOK grep -q '"includes"' vulkan_core_follow.json
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str follow.{hpp,cpp} vulkan_core_follow.json
+  requireOK gcc -c -Wall -std=c++17 -fpic follow.cpp
+  # the streaming mode and the parse cache know the includes as well
+  rm -rf follow
+  requireOK ../enumGen.py parse -s --cache follow_cache -F --shared-dir follow ../test/vulkan_core.h vulkan_core_stream.json
+  exists follow/vk_platform-*.json
+  requireOK cmp vulkan_core_follow.json vulkan_core_stream.json
+  rm -rf follow
+  requireOK ../enumGen.py parse --cache follow_cache -F --shared-dir follow ../test/vulkan_core.h vulkan_core_stream.json
+  exists follow/vk_platform-*.json
+  requireOK cmp vulkan_core_follow.json vulkan_core_stream.json
+  rm -rf follow follow_cache follow.{hpp,cpp,o} vulkan_core_follow.json vulkan_core_stream.json
+}
+
+test_detectBitfields() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h db_vulkan_core.json
+  sed 's/"indent"/"detectBitfields": true, "indent"/' ../test/cfg.json > db_cfg.json
+  requireOK ../enumGen.py -V -c db_cfg.json generate Enum2Str db.{hpp,cpp} db_vulkan_core.json 2> db.log
+  requireOK grep -q 'Skipped the bitfield functions of [1-9][0-9]* of 119 enums' db.log
+  requireOK grep -q 'VkCullModeFlagBits_toStr ' db.hpp
+  requireOK grep -q 'VkColorComponentFlagBits_toStr_Raw ' db.hpp
+  grep -q 'VkFormat_toStr\|VkResult_toStr\|VkStructureType_toStr' db.hpp && error "sequential enums have bitfield functions"
+  requireOK gcc -c -Wall -std=c++17 -fpic db.cpp
+  # an explicit override wins
+  sed 's/"indent"/"detectBitfields": true, "features": { "VkFormat": { "enableBitfields": true } }, "indent"/' ../test/cfg.json > db_cfg.json
+  requireOK ../enumGen.py -c db_cfg.json generate Enum2Str db.{hpp,cpp} db_vulkan_core.json
+  requireOK grep -q 'VkFormat_toStr ' db.hpp
+  grep -q 'VkResult_toStr' db.hpp && error "VkResult has bitfield functions"
+  # all bits set (~0) does not make flags sequential
+  echo 'enum F { F_NONE = 0, F_A = 1 << 0, F_B = 1 << 1, F_C = 1 << 2, F_ALL = ~0 };' > db_flags.hpp
+  requireOK ../enumGen.py parse db_flags.hpp db_flags.json
+  sed 's/"indent"/"detectBitfields": true, "indent"/' ../test/cfg.json > db_cfg.json
+  requireOK ../enumGen.py -c db_cfg.json generate Enum2Str db.{hpp,cpp} db_flags.json
+  requireOK grep -q 'F_toStr ' db.hpp
+  rm -f db.{hpp,cpp,o,log} db_cfg.json db_vulkan_core.json db_flags.{hpp,json}
+}
+
+test_fragmentCache() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h fc_vulkan_core.json
+  printf 'enum Small { SMALL_A, SMALL_B };\n' > fc_small.h
+  requireOK ../enumGen.py parse fc_small.h fc_small.json
+  requireOK ../enumGen.py -c ../test/cfg.json generate --cache fc_cache Enum2Str fc.{hpp,cpp} fc_vulkan_core.json fc_small.json
+  printf 'enum Small { SMALL_A, SMALL_C };\n' > fc_small.h
+  requireOK ../enumGen.py parse fc_small.h fc_small.json
+  # only the changed enum is rendered again
+  requireOK ../enumGen.py -V -c ../test/cfg.json generate --cache fc_cache Enum2Str fc.{hpp,cpp} fc_vulkan_core.json fc_small.json 2> fc.log
+  requireOK grep -q 'Fragment cache fc_cache: 119 hits, 1 misses' fc.log
+  mkdir -p fc_ref
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str fc_ref/fc.{hpp,cpp} fc_vulkan_core.json fc_small.json
+  requireOK cmp fc.cpp fc_ref/fc.cpp
+  requireOK ../enumGen.py -c ../test/cfg.json generate --cache fc_cache --cache-size 0 Enum2Str fc.{hpp,cpp} fc_vulkan_core.json fc_small.json
+  [[ -z "$(ls fc_cache)" ]] || error "the fragment cache was not evicted"
+  rm -rf fc_cache fc_ref fc_{vulkan_core,small}.json fc_small.h fc.{hpp,cpp,log}
+}
+
+test_headerOnly() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h ho_vulkan_core.json
+  sed 's/"indent"/"headerOnly": true, "useStringView": true, "indent"/' ../test/cfg.json > ho_cfg.json
+  sed 's/"indent"/"headerOnly": true, "perfectHash": true, "constexprLists": true, "indent"/; s/"useNamespace": false/"useNamespace": true/' ../test/cfg.json > ho_ph_cfg.json
+  requireOK ../enumGen.py -c ho_cfg.json    generate Enum2Str ho.{hpp,cpp}    ho_vulkan_core.json
+  requireOK ../enumGen.py -c ho_ph_cfg.json generate Enum2Ph  ho_ph.{hpp,cpp} ho_vulkan_core.json
+  # usable in constant expressions and included in several translation units
+  cat > ho_main.cpp <<'EOF'
+#include "ho.hpp"
+#include "ho_ph.hpp"
+using namespace test;
+
+static_assert(Enum2Str::toStr(VK_FORMAT_R8_UNORM) == "VK_FORMAT_R8_UNORM");
+static_assert(Enum2Str::toStr(static_cast<VkFormat>(12345)) == "<UNKNOWN>");
+static_assert(Enum2Str::toStr(VK_FORMAT_G8B8G8R8_422_UNORM) == "VK_FORMAT_G8B8G8R8_422_UNORM");
+static_assert(Enum2Str::VkFormat_fromStr("VK_FORMAT_R8_UNORM") == VK_FORMAT_R8_UNORM);
+static_assert(Enum2Str::VkFormat_fromStr("VK_FORMAT_R8_UNORM#") == static_cast<VkFormat>(-1));
+static_assert(Enum2Ph::VkFormat_fromStr("VK_FORMAT_R8_UNORM") == VK_FORMAT_R8_UNORM);
+static_assert(Enum2Ph::VkFormat_fromStr("VK_FORMAT_R8_UNORM#") == static_cast<VkFormat>(-1));
+
+std::string other();
+
+int main() {
+  std::string s = Enum2Str::VkCullModeFlagBits_toStr(3) + Enum2Ph::VkCullModeFlagBits_toStr(0) + other();
+  return s == "VK_CULL_MODE_FRONT_AND_BACKVK_CULL_MODE_NONEVK_COLOR_COMPONENT_R_BIT | VK_COLOR_COMPONENT_B_BIT" ? 0 : 1;
+}
+EOF
+  cat > ho_other.cpp <<'EOF'
+#include "ho.hpp"
+#include "ho_ph.hpp"
+std::string other() { return test::Enum2Str::VkColorComponentFlagBits_toStr(5); }
+EOF
+  requireOK gcc -Wall -Wextra -std=c++17 -o ho_main ho_main.cpp ho_other.cpp ho.cpp ho_ph.cpp -lstdc++
+  requireOK ./ho_main
+  rm -f ho_vulkan_core.json ho_cfg.json ho_ph_cfg.json ho{,_ph}.{hpp,cpp} ho_main{,.cpp} ho_other.cpp
+}
+
+test_parallelGenerate() {
+  requireOK ../enumGen.py parse ../test/test1.hpp     par_test1.json
+  requireOK ../enumGen.py parse ../test/vulkan_core.h par_vulkan_core.json
+  sed 's/"indent"/"perfectHash": true, "useStringView": true, "indent"/' ../test/cfg.json > par_cfg.json
+  mkdir -p par1 par3
+  # the same output as the serial mode
+  requireOK ../enumGen.py -c par_cfg.json generate -j 1 Enum2Str par1/par.{hpp,cpp} par_test1.json par_vulkan_core.json
+  requireOK ../enumGen.py -c par_cfg.json generate -j 3 Enum2Str par3/par.{hpp,cpp} par_test1.json par_vulkan_core.json
+  requireOK cmp par1/par.hpp par3/par.hpp
+  requireOK cmp par1/par.cpp par3/par.cpp
+  requireOK ../enumGen.py -c par_cfg.json generate -j 3 --shards 2 Enum2Str par3/par.{hpp,cpp} par_test1.json par_vulkan_core.json
+  requireOK ../enumGen.py -c par_cfg.json generate -j 1 --shards 2 Enum2Str par1/par.{hpp,cpp} par_test1.json par_vulkan_core.json
+  requireOK cmp par1/par_0.cpp par3/par_0.cpp
+  requireOK cmp par1/par_1.cpp par3/par_1.cpp
+  rm -rf par1 par3 par_{test1,vulkan_core}.json par_cfg.json
+}
+
+test_perfectHash() {
+  requireOK ../enumGen.py parse ../test/test1.hpp     ph_test1.json
+  requireOK ../enumGen.py parse ../test/vulkan_core.h ph_vulkan_core.json
+  sed 's/"indent"/"perfectHash": true, "indent"/' ../test/cfg.json > ph_cfg.json
+  requireOK ../enumGen.py -c ph_cfg.json generate Enum2Str ph.{hpp,cpp} ph_test1.json ph_vulkan_core.json
+  # every name must map to its value and nothing else may match
+  {
+    echo '#include "ph.cpp"'
+    echo 'int main() {'
+    grep -o 'std::vector< [A-Za-z0-9_:]* *> getAll_[A-Za-z0-9_]*' ph.hpp | awk '{
+      id = $2; f = substr($4, 8)
+      printf "  for (auto v : Enum2Str::getAll_%s()) {\n", f
+      printf "    if (Enum2Str::%s_fromStr(Enum2Str::toStr(v)) != v) return 1;\n", f
+      printf "    if (Enum2Str::%s_fromStr(Enum2Str::toStr(v) + \"#\") != static_cast<%s>(-1)) return 1;\n  }\n", f, id
+    }'
+    echo '  return 0;'
+    echo '}'
+  } > ph_main.cpp
+  requireOK gcc -Wall -Wno-deprecated-declarations -std=c++17 -o ph_main ph_main.cpp -lstdc++
+  requireOK ./ph_main
+  rm -f ph_test1.json ph_vulkan_core.json ph_cfg.json ph.{hpp,cpp} ph_main{,.cpp}
+}
+
+test_selection() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h sel_vulkan_core.json
+  requireOK ../enumGen.py parse --format compact ../test/test1.hpp sel_test1.enums
+  cat > sel_cfg.json <<'EOF'
+{
+  "include": ["VkFormat", "Vk*FlagBits", "re:test::(ENUM1|Meh)"],
+  "exclude": ["VkQueueFlagBits"],
+  "features": {
+    "Vk*FlagBits": { "enableFromStr": false, "enableGetList": false },
+    "VkFormat":    { "enableBitfields": false }
+  }
+}
+EOF
+  requireOK ../enumGen.py -c sel_cfg.json generate Enum2Str sel.{hpp,cpp} sel_vulkan_core.json sel_test1.enums
+  requireOK grep -q 'toStr( VkFormat ' sel.hpp
+  requireOK grep -q 'VkFormat_fromStr' sel.hpp
+  requireOK grep -q 'getAll_VkFormat' sel.hpp
+  requireOK grep -q 'VkSampleCountFlagBits_toStr ' sel.hpp
+  requireOK grep -q 'toStr( test::Meh ' sel.hpp
+  grep -q 'VkFormat_toStr\|VkSampleCountFlagBits_fromStr\|getAll_VkSampleCountFlagBits\|VkQueueFlagBits\|VkImageLayout\|Qwerty' sel.hpp && error "unselected functions were generated"
+  requireOK gcc -c -Wall -std=c++17 -fpic -Wno-deprecated-declarations -I../test sel.cpp
+  # selecting everything is the same as no selection
+  echo '{ "include": ["*"], "features": { "VkNothing": { "enableFromStr": false } } }' > sel_all.json
+  requireOK ../enumGen.py -c sel_all.json generate Enum2Str sel.{hpp,cpp} sel_vulkan_core.json sel_test1.enums
+  requireOK ../enumGen.py generate Enum2Str sel_ref.{hpp,cpp} sel_vulkan_core.json sel_test1.enums
+  requireOK cmp <(tail -n +10 sel.cpp) <(tail -n +10 sel_ref.cpp)
+  echo '{ "features": { "VkFormat": { "enableToStr": false } } }' > sel_bad.json
+  ../enumGen.py -c sel_bad.json generate Enum2Str sel.{hpp,cpp} sel_vulkan_core.json 2> sel.log && error "unknown features were accepted"
+  requireOK grep -q "unknown features \['enableToStr'\]" sel.log
+  for i in '{ "include": "VkFormat" }' '{ "features": { "VkFormat": 5 } }'; do
+    echo "$i" > sel_bad.json
+    ../enumGen.py -c sel_bad.json generate Enum2Str sel.{hpp,cpp} sel_vulkan_core.json 2> sel.log && error "the invalid config $i was accepted"
+    requireOK grep -q 'Invalid config' sel.log
+  done
+  rm -f sel.{hpp,cpp,o,log} sel_ref.{hpp,cpp} sel_{cfg,all,bad}.json sel_vulkan_core.json sel_test1.enums
+}
+
+test_server() {
+  export ENUMGEN_SOCKET="$PWD/srv.sock"
+  ../enumGen.py -V serve --idle-timeout 3 2> srv.log &
+  local i
+  for i in {1..50}; do [ -S srv.sock ] && break; sleep 0.1; done
+  exists srv.sock
+  requireOK ../enumGen.py parse ../test/vulkan_core.h srv_vulkan_core.json
+  requireOK grep -q 'Running parse ../test/vulkan_core.h srv_vulkan_core.json' srv.log
+  ENUMGEN_SOCKET= requireOK ../enumGen.py parse ../test/vulkan_core.h srv_ref.json
+  requireOK cmp srv_vulkan_core.json srv_ref.json
+  # parallel requests, the exit code and the output of the command
+  local pids=()
+  for i in 1 2 3; do
+    ../enumGen.py -c ../test/cfg.json generate Enum2Str srv_$i.{hpp,cpp} srv_vulkan_core.json &
+    pids+=($!)
+  done
+  wait "${pids[@]}"
+  requireOK cmp <(tail -n +10 srv_1.cpp) <(tail -n +10 srv_2.cpp)
+  requireOK cmp <(tail -n +10 srv_1.cpp) <(tail -n +10 srv_3.cpp)
+  ../enumGen.py parse srv_missing.h srv_missing.json 2> /dev/null && error "the exit code was not forwarded"
+  # only the command decides if a request is forwarded, not a file name
+  cp ../test/test1.hpp serve
+  requireOK ../enumGen.py parse serve srv_test1.json
+  requireOK grep -q 'Running parse serve srv_test1.json' srv.log
+  [[ "$(../enumGen.py -C)" == "$(ENUMGEN_SOCKET= ../enumGen.py -C)" ]] || error "the output was not forwarded"
+  # stops once idle
+  for i in {1..100}; do [ -e srv.sock ] || break; sleep 0.1; done
+  [ -e srv.sock ] && error "the server did not stop"
+  requireOK grep -q 'Stopping after 3.0s without requests' srv.log
+  wait
+  unset ENUMGEN_SOCKET
+  # the default socket is in a directory that only the user can access
+  mkdir -p -m 755 srv_open
+  XDG_RUNTIME_DIR="$PWD/srv_open" ../enumGen.py serve 2> /dev/null && error "served in a directory of other users"
+  XDG_RUNTIME_DIR= TMPDIR="$PWD" ../enumGen.py -V serve --idle-timeout 2 2> srv.log &
+  for i in {1..50}; do compgen -G "enumGen-$UID/*.sock" > /dev/null && break; sleep 0.1; done
+  [[ "$(stat -c %a "enumGen-$UID")" == 700 ]] || error "the socket directory can be accessed by others"
+  XDG_RUNTIME_DIR= TMPDIR="$PWD" requireOK ../enumGen.py parse ../test/test1.hpp srv_test1.json
+  requireOK grep -q 'Running parse ../test/test1.hpp srv_test1.json' srv.log
+  wait
+  rm -rf serve srv.log srv_open "enumGen-$UID" srv_vulkan_core.json srv_ref.json srv_test1.json srv_{1,2,3}.{hpp,cpp}
+}
+
+test_shards() {
+  requireOK ../enumGen.py parse ../test/vulkan_core.h sh_vulkan_core.json
+  printf 'enum Small { SMALL_A, SMALL_B };\n' > sh_small.h
+  requireOK ../enumGen.py parse sh_small.h sh_small.json
+  requireOK ../enumGen.py -c ../test/cfg.json generate --shards 3 Enum2Str sh.{hpp,cpp} sh_vulkan_core.json sh_small.json
+  exists sh_{0,1,2}.cpp
+  requireOK ../enumGen.py -c ../test/cfg.json generate --shards 3 Enum2Str sh_again.{hpp,cpp} sh_vulkan_core.json sh_small.json
+  for i in 0 1 2; do
+    requireOK cmp <(sed 's/sh_again/sh/' sh_again_$i.cpp) sh_$i.cpp
+  done
+  # a changed enum list only rewrites its own shard
+  requireOK ../enumGen.py -c ../test/cfg.json generate --depfile sh.d --shard-per-input Enum2Str sh.{hpp,cpp} sh_vulkan_core.json sh_small.json
+  exists sh_sh_{vulkan_core,small}.cpp
+  requireOK grep -q 'sh_sh_small.cpp:' sh.d
+  touch -d @0 sh_sh_vulkan_core.cpp
+  printf 'enum Small { SMALL_A, SMALL_C };\n' > sh_small.h
+  requireOK ../enumGen.py parse sh_small.h sh_small.json
+  requireOK ../enumGen.py -c ../test/cfg.json generate --shard-per-input Enum2Str sh.{hpp,cpp} sh_vulkan_core.json sh_small.json
+  [[ "$(stat -c %Y sh_sh_vulkan_core.cpp)" == 0 ]] || error "the unchanged shard was rewritten"
+  requireOK grep -q SMALL_C sh_sh_small.cpp
+  cat > sh_main.cpp <<'EOF'
+#include "sh.hpp"
+int main() {
+  using namespace test;
+  return Enum2Str::toStr(SMALL_C) == "SMALL_C" && Enum2Str::VkFormat_fromStr("VK_FORMAT_R8_UNORM") == VK_FORMAT_R8_UNORM ? 0 : 1;
+}
+EOF
+  requireOK gcc -Wall -Wextra -std=c++17 -o sh_main sh_main.cpp sh.cpp sh_sh_vulkan_core.cpp sh_sh_small.cpp -lstdc++
+  requireOK ./sh_main
+  rm -f sh_{vulkan_core,small}.json sh_small.h sh{,_again}.{hpp,cpp} sh{,_again}_{0,1,2}.cpp sh_sh_{vulkan_core,small}.cpp sh.d sh_main{,.cpp}
+}
+
+test_stringPool() {
+  requireOK ../enumGen.py parse ../test/test1.hpp     sp_test1.json
+  requireOK ../enumGen.py parse ../test/vulkan_core.h sp_vulkan_core.json
+  mkdir -p sp_ref sp_pool
+  # the same results with and without the string pool
+  for extra in '' '"perfectHash": true, "useStringView": true,'; do
+    sed "s/\"indent\"/$extra \"indent\"/" ../test/cfg.json > sp_ref/cfg.json
+    sed "s/\"indent\"/$extra \"stringPool\": true, \"indent\"/" ../test/cfg.json > sp_pool/cfg.json
+    for i in sp_ref sp_pool; do
+      requireOK ../enumGen.py -c $i/cfg.json generate Enum2Str $i/sp.{hpp,cpp} sp_test1.json sp_vulkan_core.json
+      {
+        echo '#include "sp.cpp"'
+        echo '#include <iostream>'
+        echo 'int main() {'
+        grep -o 'std::vector< [A-Za-z0-9_:]* *> getAll_[A-Za-z0-9_]*' $i/sp.hpp | awk '{
+          f = substr($4, 8)
+          printf "  for (auto v : Enum2Str::getAll_%s()) {\n", f
+          printf "    std::cout << Enum2Str::toStr(v) << (Enum2Str::%s_fromStr(Enum2Str::toStr(v)) == v) << \"\\n\";\n", f
+          printf "    std::cout << Enum2Str::%s_toStr(static_cast<uint64_t>(v)) << \"\\n\";\n  }\n", f
+          printf "  std::cout << Enum2Str::%s_toStr(~uint64_t(0)) << \"\\n\";\n", f
+        }'
+        echo '}'
+      } > $i/main.cpp
+      requireOK gcc -Wall -Wno-deprecated-declarations -std=c++17 -o $i/main $i/main.cpp -lstdc++
+      ./$i/main > $i/out.txt
+    done
+    requireOK cmp sp_ref/out.txt sp_pool/out.txt
+  done
+  requireOK grep -q 'namePool\[1\]\[[0-9]*\] = {' sp_pool/sp.cpp
+  # pools over 64 KiB are split into rows (MSVC limits string literals)
+  awk 'BEGIN { print "enum Big {"; for (i = 0; i < 3000; i++) printf "  BIG_ENTRY_WITH_A_RATHER_LONG_NAME_%05d,\n", i; print "};" }' > sp_big.hpp
+  requireOK ../enumGen.py parse sp_big.hpp sp_big.json
+  for mode in cpp hpp; do
+    extra=$([[ $mode == hpp ]] && echo '"headerOnly": true,')
+    sed "s/\"indent\"/$extra \"stringPool\": true, \"indent\"/" ../test/cfg.json > sp_pool/cfg.json
+    requireOK ../enumGen.py -c sp_pool/cfg.json generate Enum2Str sp_pool/sp.{hpp,cpp} sp_big.json
+    requireOK grep -q 'namePool\[2\]\[[0-9]*\] = {' sp_pool/sp.$mode
+    printf '#include "sp.%s"\nusing namespace test;\nint main() {\n  for (auto v : Enum2Str::getAll_Big()) {\n' $mode > sp_pool/main.cpp
+    printf '    if (Enum2Str::Big_fromStr(Enum2Str::toStr(v)) != v) return 1;\n  }\n  return 0;\n}\n' >> sp_pool/main.cpp
+    requireOK gcc -Wall -std=c++17 -o sp_pool/main sp_pool/main.cpp -lstdc++
+    requireOK ./sp_pool/main
+  done
+  rm -rf sp_ref sp_pool sp_test1.json sp_vulkan_core.json sp_big.{hpp,json}
+}
+
+test_stringView() {
+  requireOK ../enumGen.py parse ../test/test1.hpp     sv_test1.json
+  requireOK ../enumGen.py parse ../test/vulkan_core.h sv_vulkan_core.json
+  sed 's/"indent"/"useStringView": true, "enableFromStr": false, "enableBitfields": false, "indent"/' ../test/cfg.json > sv_cfg.json
+  requireOK ../enumGen.py -c ../test/cfg.json generate Enum2Str  sv_ref.{hpp,cpp} sv_test1.json sv_vulkan_core.json
+  requireOK ../enumGen.py -c sv_cfg.json      generate Enum2View sv.{hpp,cpp}     sv_test1.json sv_vulkan_core.json
+  # both must return the same for all values and all gaps between them
+  cat > sv_main.cpp <<'EOF'
+#include "sv_ref.cpp"
+#include "sv.cpp"
+
+template <typename E>
+bool same(std::vector<E> _all) {
+  int64_t lo = INT64_MAX, hi = INT64_MIN;
+  for (auto v : _all) {
+    if (Enum2Str::toStr(v) != Enum2View::toStr(v)) return false;
+    lo = std::min(lo, static_cast<int64_t>(v));
+    hi = std::max(hi, static_cast<int64_t>(v));
+  }
+  for (int64_t k = lo; !_all.empty() && k <= hi && k - lo < 4096; ++k) {
+    if (Enum2Str::toStr(static_cast<E>(k)) != Enum2View::toStr(static_cast<E>(k))) return false;
+  }
+  return true;
+}
+
+int main() {
+  bool ok = true;
+EOF
+  grep -o 'getAll_[A-Za-z0-9_]*' sv_ref.hpp | awk '{ printf "  ok = ok && same(Enum2Str::%s());\n", $1 }' >> sv_main.cpp
+  printf '  return ok ? 0 : 1;\n}\n' >> sv_main.cpp
+  requireOK gcc -Wall -Wno-deprecated-declarations -std=c++17 -o sv_main sv_main.cpp -lstdc++
+  requireOK ./sv_main
+  # an enum without entries does not use its parameter
+  echo 'enum Empty {};' > sv_empty.hpp
+  requireOK ../enumGen.py parse sv_empty.hpp sv_empty.json
+  requireOK ../enumGen.py -c sv_cfg.json generate Enum2View sv.{hpp,cpp} sv_empty.json
+  requireOK gcc -c -Wall -Wextra -Werror -std=c++17 -o sv.o sv.cpp
+  rm -f sv_test1.json sv_vulkan_core.json sv_empty.{hpp,json} sv_cfg.json sv_ref.{hpp,cpp} sv.{hpp,cpp,o} sv_main{,.cpp}
+}
+
 
 main() {
   # check for requirements